@@ -0,0 +1,318 @@
+"""Benchmarks -- 用合成数据测 viewer / plot_curves / trajectory_generation 的耗时和内存
+
+Every case runs in a fresh process, so the peak resident memory of one case
+is not inflated by the previous ones. The viewers render offscreen.
+
+    python benchmarks.py --out results.json
+    python benchmarks.py --max-steps 1000000 --max-runs 500 --out full.json
+    python benchmarks.py --baseline results.json --out new.json
+
+The script exits with 1 when a case fails, or with --baseline when a case
+got slower than the tolerance.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import os.path as osp
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+STEP_SIZES = (100, 1000, 10000, 100000, 1000000)
+RUN_SIZES = (1, 10, 100, 500)
+# Steps of every synthetic run of the log directory cases
+RUN_STEPS = 2000
+# Imported by every case before the clock starts
+MODULES = ('plot_curves', 'q_analytics', 'show_q_value_discrete', 'show_q_value_discrete_mix', 'show_trajectory',
+           'trajectory_generation', 'player')
+
+
+def synthetic_episode(num, rng=None):
+    """
+    Random episode of num steps with every field of episode_store.STEP_FIELDS.
+    """
+    rng = np.random.default_rng(rng)
+    walk = np.cumsum(rng.normal(scale=0.002, size=(2, num, 3)), axis=1)
+    return dict(left_points=walk[0] + [0, -0.15, 1.1],
+                right_points=walk[1] + [0, 0.15, 1.1],
+                left_act=rng.integers(0, 7, num),
+                right_act=rng.integers(0, 7, num),
+                left_q=rng.random((num, 7)),
+                right_q=rng.random((num, 7)),
+                q_arrays=rng.random((num, 7, 7)))
+
+
+def synthetic_logdir(root, runs, steps=RUN_STEPS, performance='reward', rng=None):
+    """
+    Write runs directories with a config.json and a Step/Value csv, like the tensorboard exports.
+    """
+    import pandas as pd
+    rng = np.random.default_rng(rng)
+    for i in range(runs):
+        run_dir = osp.join(root, 'exp%d_s%d' % (i % 4, i))
+        os.makedirs(run_dir, exist_ok=True)
+        with open(osp.join(run_dir, 'config.json'), 'w') as f:
+            json.dump(dict(exp_name='exp%d' % (i % 4)), f)
+        pd.DataFrame(dict(Wall=np.zeros(steps), Step=np.arange(steps) * 1000,
+                          Value=np.cumsum(rng.normal(size=steps)))).to_csv(osp.join(run_dir, performance + '.csv'),
+                                                                           index=False)
+    return root
+
+
+def _episode_args(size, tmp):
+    episode = synthetic_episode(size, 0)
+    episode['num'] = size
+    episode['scene'] = 'dualarm'
+    return episode
+
+
+def _render(viewer, **kwargs):
+    from player import render_actors
+
+    def run(args, tmp):
+        actors = viewer(**args, **kwargs)
+        render_actors(actors, osp.join(tmp, 'still.png'))
+    return run
+
+
+def _screenshot(viewer, **kwargs):
+    def run(args, tmp):
+        viewer(**args, screenshot=osp.join(tmp, 'still.png'), **kwargs)
+    return run
+
+
+def _trajectory_args(size, tmp):
+    args = _episode_args(size, tmp)
+    ref = np.linspace([0, 0, 1.3], [0, 0, 1.1], 100)
+    for key in ('left_q', 'right_q', 'q_arrays'):
+        del args[key]
+    return dict(args, left_points_ref=ref + [0, -0.25, 0], right_points_ref=ref + [0, 0.25, 0])
+
+
+def _continuous_args(size, tmp):
+    args = _trajectory_args(size, tmp)
+    rng = np.random.default_rng(1)
+    return dict(args, left_act=rng.normal(size=(size, 3)), right_act=rng.normal(size=(size, 3)))
+
+
+def _q_discrete_args(size, tmp):
+    args = _episode_args(size, tmp)
+    del args['q_arrays']
+    return args
+
+
+def _q_mix_args(size, tmp):
+    args = _episode_args(size, tmp)
+    del args['left_q'], args['right_q']
+    return args
+
+
+def _stream(args, tmp):
+    from show_q_value_discrete_mix import iter_chunks, show_q_value_discrete_mix_stream
+    chunks = iter_chunks(args['left_points'], args['right_points'], args['q_arrays'],
+                         args['left_act'], args['right_act'])
+    show_q_value_discrete_mix_stream(chunks, args['scene'], screenshot=osp.join(tmp, 'still.png'))
+
+
+def _q_matrix(args, tmp):
+    from show_q_value_discrete_mix import q_matrix
+    for i in range(args['num']):
+        q_matrix(args['q_arrays'][i], tuple(args['left_points'][i]))
+
+
+def _q_matrix_batched(args, tmp):
+    from show_q_value_discrete_mix import q_matrix_batched
+    q_matrix_batched(args['q_arrays'], [args['left_points'], args['right_points']])
+
+
+def _joint_q_stats(args, tmp):
+    from q_analytics import joint_q_stats
+    joint_q_stats(args['q_arrays'], args['left_q'], args['right_q'])
+
+
+def _control_points(size, tmp):
+    return dict(base=np.array([[0, 0, 1.4], [0.05, 0, 1.3], [0, 0.05, 1.2], [0, 0, 1.1]]), num=size)
+
+
+def _reference_trajectory(args, tmp):
+    from trajectory_generation import random_control_points, reference_trajectory
+    reference_trajectory(random_control_points(args['base'], args['num'], 0.01, 0))
+
+
+def _reference_trajectory_arc(args, tmp):
+    from trajectory_generation import random_control_points, reference_trajectory_arc
+    reference_trajectory_arc(random_control_points(args['base'], args['num'], 0.01, 0), density=200)
+
+
+def _logdir_args(size, tmp):
+    return dict(logdir=synthetic_logdir(osp.join(tmp, 'logs'), size), cache_dir=osp.join(tmp, 'cache'))
+
+
+def _cached_logdir_args(size, tmp):
+    from plot_curves import get_all_datasets
+    args = _logdir_args(size, tmp)
+    get_all_datasets([args['logdir']], 'reward', None, None, cache_dir=args['cache_dir'])
+    return args
+
+
+def _get_all_datasets(cache):
+    def run(args, tmp):
+        from plot_curves import get_all_datasets
+        get_all_datasets([args['logdir']], 'reward', None, None, cache_dir=args['cache_dir'] if cache else None)
+    return run
+
+
+def _plot_data(args, tmp):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from plot_curves import get_all_datasets, plot_data
+    data = get_all_datasets([args['logdir']], 'reward', None, None, cache_dir=args['cache_dir'])
+    plt.figure()
+    plot_data(data, 'reward', 'Condition1', 10, np.mean)
+    plt.close('all')
+
+
+# name: (size kind, largest size, setup(size, tmp) -> args, run(args, tmp))
+# The per-actor viewers stop well before the batched ones, a million Arrow actors never finishes.
+CASES = {
+    'show_trajectory_discrete': ('steps', 1000, _trajectory_args, None),
+    'show_trajectory_discrete_batched': ('steps', None, _trajectory_args, None),
+    'show_trajectory_continuous_batched': ('steps', None, _continuous_args, None),
+    'show_q_value_discrete': ('steps', 1000, _q_discrete_args, None),
+    'show_q_value_discrete_batched': ('steps', None, _q_discrete_args, None),
+    'show_q_value_discrete_mix_batched': ('steps', 100000, _q_mix_args, None),
+    'show_q_value_discrete_mix_stream': ('steps', 100000, _q_mix_args, _stream),
+    'q_matrix': ('steps', 1000, _episode_args, _q_matrix),
+    'q_matrix_batched': ('steps', 100000, _episode_args, _q_matrix_batched),
+    'joint_q_stats': ('steps', None, _episode_args, _joint_q_stats),
+    'reference_trajectory': ('steps', 100000, _control_points, _reference_trajectory),
+    'reference_trajectory_arc': ('steps', 100000, _control_points, _reference_trajectory_arc),
+    'get_all_datasets': ('runs', None, _logdir_args, _get_all_datasets(cache=False)),
+    'get_all_datasets_cached': ('runs', None, _cached_logdir_args, _get_all_datasets(cache=True)),
+    'plot_data': ('runs', None, _logdir_args, _plot_data),
+}
+
+
+def _viewer_run(name):
+    """
+    run() of the viewer cases, imported lazily so the driver process never loads vedo.
+    """
+    from show_q_value_discrete import show_q_value_discrete
+    from show_q_value_discrete_mix import show_q_value_discrete_mix
+    from show_trajectory import show_trajectory_continuous, show_trajectory_discrete
+    return {
+        'show_trajectory_discrete': _render(show_trajectory_discrete),
+        'show_trajectory_discrete_batched': _render(show_trajectory_discrete, batched=True),
+        'show_trajectory_continuous_batched': _render(show_trajectory_continuous, batched=True),
+        'show_q_value_discrete': _screenshot(show_q_value_discrete),
+        'show_q_value_discrete_batched': _screenshot(show_q_value_discrete, batched=True),
+        'show_q_value_discrete_mix_batched': _screenshot(show_q_value_discrete_mix, batched=True),
+    }[name]
+
+
+def run_case(name, size, repeat=1):
+    """
+    Time one case at one size in the calling process.
+
+    Returns:
+        dict with the best wall time of the repeats, the tracemalloc peak of the
+        Python and NumPy allocations of the measured call (VTK memory is not
+        traced), the peak resident memory of the process, or the error
+
+    """
+    kind, _, setup, run = CASES[name]
+    for module in MODULES:
+        importlib.import_module(module)
+    run = run or _viewer_run(name)
+    result = dict(case=name, kind=kind, size=size)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            args = setup(size, tmp)
+            times = []
+            for i in range(repeat):
+                tracemalloc.start()
+                start = time.perf_counter()
+                run(args, tmp)
+                times.append(time.perf_counter() - start)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            result.update(seconds=min(times), traced_peak_mb=peak / 2 ** 20)
+        except Exception:
+            result['error'] = traceback.format_exc(limit=3)
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_benchmarks(cases=None, max_steps=10000, max_runs=100, repeat=1):
+    """
+    Run every case at every size up to max_steps / max_runs, one fresh process per measurement.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in cases or CASES:
+        kind, largest, _, _ = CASES[name]
+        limit = min(largest or np.inf, max_steps if kind == 'steps' else max_runs)
+        for size in STEP_SIZES if kind == 'steps' else RUN_SIZES:
+            if size > limit:
+                break
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_case, name, size, repeat).result()
+            print('%-36s %8d %s' % (name, size, '%.3fs  %.1f MB' % (result['seconds'], result['max_rss_mb'])
+                                    if 'error' not in result else 'error'))
+            if 'error' in result:
+                print(result['error'])
+            results.append(result)
+    return results
+
+
+def environment_info():
+    import vedo
+    return dict(python=platform.python_version(), numpy=np.__version__, vedo=vedo.__version__,
+                platform=platform.platform(), time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Cases of results slower than in baseline by more than tolerance, as (case, size, old, new).
+    """
+    old = {(r['case'], r['size']): r['seconds'] for r in baseline['results'] if 'seconds' in r}
+    return [(r['case'], r['size'], old[r['case'], r['size']], r['seconds']) for r in results
+            if 'seconds' in r and (r['case'], r['size']) in old
+            and r['seconds'] > old[r['case'], r['size']] * (1 + tolerance)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', nargs='*', choices=sorted(CASES))
+    parser.add_argument('--max-steps', type=int, default=10000)
+    parser.add_argument('--max-runs', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--out', default='benchmarks.json')
+    parser.add_argument('--baseline', help='earlier results, exit with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.max_steps, args.max_runs, args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(dict(environment=environment_info(), results=results), f, indent=1)
+
+    failed = sorted({r['case'] for r in results if 'error' in r})
+    if failed:
+        print('failed: ' + ' '.join(failed))
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for case, size, old, new in regressions:
+            print('regression %s %d: %.3fs -> %.3fs' % (case, size, old, new))
+    sys.exit(1 if failed or regressions else 0)
@@ -0,0 +1,198 @@
+"""Clearance -- 末端轨迹和场景几何的有符号距离 / 首次接触
+
+Every shape of scenes.SCENES is a dict(pos=[end0, end1], r=radius), a solid
+cylinder by default. kind='capsule' rounds the ends, r_inner > 0 makes a
+hollow cylinder like the rings around the holes of plot_env. Shapes marked
+target are where the paths should end, they are not obstacles. An obstacle
+with a goal, like the top of a rod, is not in contact within goal_tol of it.
+
+    python clearance.py    # the stock reference trajectories must be collision free
+"""
+import numpy as np
+
+from scenes import SCENES
+
+
+def scene_shapes(scene, target=False):
+    """
+    Obstacles of a scene as arrays, or its targets with target=True, an unknown scene has none.
+
+    Returns:
+        dict of NumPy arrays
+            a, b: (S, 3) axis end points
+            r, r_inner: (S,) outer and inner radius
+            capsule: (S,) bool
+            goal: (S, 3) goal point, NaN without goal
+            goal_tol: (S,) contact within goal_tol of the goal is ignored
+
+    """
+    shapes = [s for s in SCENES.get(scene, []) if s.get('target', False) == target]
+    return dict(a=np.array([s['pos'][0] for s in shapes], dtype=float).reshape(-1, 3),
+                b=np.array([s['pos'][1] for s in shapes], dtype=float).reshape(-1, 3),
+                r=np.array([s['r'] for s in shapes], dtype=float),
+                r_inner=np.array([s.get('r_inner', 0) for s in shapes], dtype=float),
+                capsule=np.array([s.get('kind', 'cylinder') == 'capsule' for s in shapes], dtype=bool),
+                goal=np.array([s.get('goal', (np.nan,) * 3) for s in shapes], dtype=float).reshape(-1, 3),
+                goal_tol=np.array([s.get('goal_tol', s['r']) for s in shapes], dtype=float))
+
+
+def signed_distance(points, shapes):
+    """
+    Signed distance of points to every shape, negative inside.
+
+    Args:
+        points: (..., 3)
+        shapes: scene_shapes dict
+
+    Returns:
+        (..., S)
+
+    """
+    points = np.asarray(points, dtype=float)[..., None, :]
+    axis = shapes['b'] - shapes['a']
+    length = np.sqrt(np.sum(axis ** 2, axis=-1))
+    unit = axis / np.where(length > 0, length, 1)[:, None]
+    rel = points - shapes['a']
+    h = np.sum(rel * unit, axis=-1)
+    rho = np.sqrt(np.maximum(np.sum(rel ** 2, axis=-1) - h ** 2, 0))
+
+    # 胶囊: 到轴线段的距离减半径
+    capsule = np.sqrt(np.maximum(rho ** 2 + (h - np.clip(h, 0, length)) ** 2, 0)) - shapes['r']
+
+    # 圆柱: 径向和轴向两个方向的距离, 空心圆柱的径向距离按圆环算
+    r_inner = shapes['r_inner']
+    radial = np.where(r_inner > 0,
+                      np.abs(rho - (shapes['r'] + r_inner) / 2) - (shapes['r'] - r_inner) / 2,
+                      rho - shapes['r'])
+    axial = np.abs(h - length / 2) - length / 2
+    outside = np.sqrt(np.maximum(radial, 0) ** 2 + np.maximum(axial, 0) ** 2)
+    cylinder = outside + np.minimum(np.maximum(radial, axial), 0)
+    return np.where(shapes['capsule'], capsule, cylinder)
+
+
+def clearance(points, scene, radius=0.0, target=False):
+    """
+    Clearance of every point to the nearest obstacle of a scene, or to the nearest target with target=True.
+
+    Args:
+        points: (..., 3) end-effector positions, NaN rows for padding
+        scene: dualarm, dualarmrod or any scene of scenes.SCENES
+        radius: radius of the end effector, subtracted from the distance
+
+    Returns:
+        distance: (...,) signed clearance, inf without shapes or for NaN rows,
+            a shape does not count within goal_tol + radius of its goal
+        shape: (...,) index of the nearest shape, -1 without shapes
+
+    """
+    shapes = scene_shapes(scene, target)
+    points = np.asarray(points, dtype=float)
+    if len(shapes['r']) == 0:
+        return np.full(points.shape[:-1], np.inf), np.full(points.shape[:-1], -1)
+    distance = signed_distance(points, shapes) - radius
+    # 目标点附近的接触是插入本身, 不算碰撞
+    to_goal = np.sqrt(np.sum((points[..., None, :] - shapes['goal']) ** 2, axis=-1))
+    distance = np.where(to_goal <= shapes['goal_tol'] + radius, np.inf, distance)
+    distance = np.where(np.isnan(distance), np.inf, distance)
+    shape = np.argmin(distance, axis=-1)
+    return np.take_along_axis(distance, shape[..., None], axis=-1)[..., 0], shape
+
+
+def goal_distance(points, scene):
+    """
+    Distance of points to the nearest goal of a scene, signed for target shapes,
+    inf for NaN rows or a scene without targets and goals.
+    """
+    points = np.asarray(points, dtype=float)
+    distance = clearance(points, scene, target=True)[0]
+    goals = np.array([s['goal'] for s in SCENES.get(scene, []) if 'goal' in s], dtype=float).reshape(-1, 3)
+    if len(goals):
+        to_goal = np.sqrt(np.sum((points[..., None, :] - goals) ** 2, axis=-1)).min(axis=-1)
+        distance = np.minimum(distance, np.where(np.isnan(to_goal), np.inf, to_goal))
+    return distance
+
+
+def subdivide(points, substeps):
+    """
+    Insert substeps - 1 linearly interpolated points between consecutive steps of (..., N, 3) paths.
+    """
+    points = np.asarray(points, dtype=float)
+    if substeps <= 1:
+        return points
+    t = np.arange(substeps) / substeps
+    start = points[..., :-1, None, :]
+    dense = start + t[:, None] * (points[..., 1:, None, :] - start)
+    dense = dense.reshape(points.shape[:-2] + (-1, 3))
+    return np.concatenate((dense, points[..., -1:, :]), axis=-2)
+
+
+def check_paths(points, scene, radius=0.0, margin=0.0, substeps=1):
+    """
+    Clearance summary of a batch of end-effector paths.
+
+    Args:
+        points: (B, N, 3) or (N, 3) paths, NaN rows pad shorter paths
+        scene: scene name of scenes.SCENES
+        radius: radius of the end effector
+        margin: a step is in contact when its clearance is below margin
+        substeps: also check substeps - 1 points between consecutive steps, so
+            fast paths cannot jump through thin shapes
+
+    Returns:
+        dict of NumPy arrays
+            clearance: (B, N) signed clearance of every step
+            min_clearance: (B,) smallest clearance along the path
+            first_contact: (B,) first time in steps with clearance below margin,
+                fractional with substeps, inf for collision-free paths
+            shape: (B,) nearest obstacle at first contact, or at the smallest clearance
+            collision_free: (B,) bool
+            goal_distance: (B,) goal_distance of the last valid step
+
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 2:
+        points = points[None]
+    dense = subdivide(points, substeps)
+    distance, shape = clearance(dense, scene, radius)
+
+    contact = distance < margin
+    hit = contact.any(axis=-1)
+    first = np.where(hit, np.argmax(contact, axis=-1), np.argmin(distance, axis=-1))
+    rows = np.arange(len(points))
+    valid = ~np.isnan(points).any(axis=-1)
+    last = np.maximum(valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1), 0)
+    return dict(clearance=distance[:, ::max(substeps, 1)],
+                min_clearance=np.min(distance, axis=-1),
+                first_contact=np.where(hit, first / max(substeps, 1), np.inf),
+                shape=shape[rows, first],
+                collision_free=~hit,
+                goal_distance=goal_distance(points[rows, last], scene))
+
+
+def dual_arm_check_paths(left_points, right_points, scene, radius=0.0, margin=0.0, substeps=1):
+    """
+    check_paths of both arms, a pair of paths is collision free when both arms are.
+
+    Returns:
+        left, right, collision_free -- two check_paths dicts and (B,) bool
+
+    """
+    left = check_paths(left_points, scene, radius, margin, substeps)
+    right = check_paths(right_points, scene, radius, margin, substeps)
+    return left, right, left['collision_free'] & right['collision_free']
+
+
+if __name__ == '__main__':
+    from trajectory_generation import REFERENCE_CONTROL_POINTS, reference_trajectory
+
+    for scene, control_points in REFERENCE_CONTROL_POINTS.items():
+        left, right, free = dual_arm_check_paths(*reference_trajectory(control_points), scene, radius=0.005, substeps=4)
+        print('%-12s collision free %s, min clearance %.4f %.4f, goal distance %.4f %.4f'
+              % (scene, free[0], left['min_clearance'][0], right['min_clearance'][0],
+                 left['goal_distance'][0], right['goal_distance'][0]))
+        assert free.all(), scene + ' reference trajectory collides'
+
+    # 横穿杆的路径必须算碰撞
+    crossing = check_paths(np.linspace([-0.1, -0.25, 1.2], [0.1, -0.25, 1.2], 50), 'dualarmrod', radius=0.005)
+    print('crossing the rod: first contact at step %g' % crossing['first_contact'][0])
+    assert not crossing['collision_free'][0], 'a path through the rod is collision free'
@@ -0,0 +1,178 @@
+"""Episode metrics -- 批量计算每个 episode 的统计量, 写成 plot_curves 能读的曲线
+
+    python episode_metrics.py eval/ckpt_100000 --step 100000 --out logs/eval_exp --exp_name exp
+    python plot_curves.py logs/eval_exp -p q_entropy
+"""
+import json
+import os
+import os.path as osp
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from episode_store import EpisodeStore
+
+# Episodes per task of the worker pool
+CHUNK = 64
+
+
+def path_length(points):
+    """
+    Length of a (num, 3) polyline.
+    """
+    return float(np.sum(np.linalg.norm(np.diff(points, axis=0), axis=1)))
+
+
+def switch_rate(acts):
+    """
+    Fraction of consecutive steps whose action changes.
+    """
+    acts = np.asarray(acts).reshape(len(acts), -1)
+    if len(acts) < 2:
+        return 0.0
+    return float(np.mean(np.any(acts[1:] != acts[:-1], axis=1)))
+
+
+def q_entropy(q, temperature=1.0):
+    """
+    Entropy in nats of the Boltzmann policy softmax(q / temperature) of every step.
+
+    Args:
+        q: (num, ...) Q of every action, e.g. (num, 7) or a joint (num, 7, 7)
+
+    Returns:
+        (num,)
+
+    """
+    z = np.asarray(q, dtype=float).reshape(len(q), -1) / temperature
+    z = z - z.max(axis=1, keepdims=True)
+    p = np.exp(z)
+    total = p.sum(axis=1)
+    return np.log(total) - np.sum(p * z, axis=1) / total
+
+
+def episode_metrics(episode, temperature=1.0):
+    """
+    Summary of one episode, only the metrics of the fields it has.
+
+    Args:
+        episode: Episode of an EpisodeStore, or a dict with the same fields
+        temperature: of the policy whose entropy is measured
+
+    Returns:
+        dict of floats
+            steps
+            left_path_length, right_path_length
+            arm_distance_mean, arm_distance_min: distance between the two arms
+            left_switch_rate, right_switch_rate: fraction of steps changing action
+            q_entropy: mean entropy of the joint Q policy
+            left_q_entropy, right_q_entropy: mean entropy of the local Q policies
+
+    """
+    metrics = {}
+    for arm in ('left', 'right'):
+        if arm + '_points' in episode:
+            points = np.asarray(episode[arm + '_points'], dtype=float)
+            metrics['steps'] = float(len(points))
+            metrics[arm + '_path_length'] = path_length(points)
+    if 'left_points' in episode and 'right_points' in episode:
+        distance = np.linalg.norm(np.asarray(episode['left_points'], dtype=float)
+                                  - np.asarray(episode['right_points'], dtype=float), axis=1)
+        metrics['arm_distance_mean'] = float(distance.mean()) if len(distance) else np.nan
+        metrics['arm_distance_min'] = float(distance.min()) if len(distance) else np.nan
+    for arm in ('left', 'right'):
+        if arm + '_act' in episode:
+            metrics[arm + '_switch_rate'] = switch_rate(np.asarray(episode[arm + '_act']))
+    for name, field in (('q_entropy', 'q_arrays'), ('left_q_entropy', 'left_q'), ('right_q_entropy', 'right_q')):
+        if field in episode:
+            q = np.asarray(episode[field])
+            metrics[name] = float(q_entropy(q, temperature).mean()) if len(q) else np.nan
+    return metrics
+
+
+def _store_metrics(store_path, indices, temperature):
+    store = EpisodeStore(store_path)
+    return [episode_metrics(store[i], temperature) for i in indices]
+
+
+def evaluate_store(store_path, processes=None, temperature=1.0, chunk=CHUNK):
+    """
+    episode_metrics of every episode of a store, in a pool of worker processes.
+
+    Every task opens its own memmap of the store and summarizes chunk episodes,
+    so only the summaries travel between the processes.
+
+    Args:
+        store_path: directory of an EpisodeStore
+        processes: worker processes, os.cpu_count() by default, 0 computes in this process
+
+    Returns:
+        dict of (E,) NumPy arrays, one per metric
+
+    """
+    num = len(EpisodeStore(store_path))
+    tasks = [range(b, min(b + chunk, num)) for b in range(0, num, chunk)]
+    if processes == 0:
+        rows = [_store_metrics(store_path, task, temperature) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            rows = list(pool.map(_store_metrics, [store_path] * len(tasks), tasks, [temperature] * len(tasks)))
+    rows = sum(rows, [])
+    names = list(rows[0]) if rows else []
+    return {name: np.array([row.get(name, np.nan) for row in rows]) for name in names}
+
+
+def write_metrics(metrics, out_dir, step, exp_name=None):
+    """
+    Append one evaluation to a run directory that plot_curves reads like a training run.
+
+    Every metric gets its own <metric>.csv with Wall/Step/Value columns, Value
+    being the mean over the episodes, and episodes.csv keeps every episode of
+    every evaluation. config.json is written once with exp_name.
+
+    Args:
+        metrics: evaluate_store result
+        out_dir: run directory
+        step: training step of the evaluated checkpoint
+        exp_name: experiment name, the name of out_dir by default
+
+    Returns:
+        out_dir
+
+    """
+    import pandas as pd
+    os.makedirs(out_dir, exist_ok=True)
+    config_path = osp.join(out_dir, 'config.json')
+    if not osp.exists(config_path):
+        with open(config_path, 'w') as f:
+            json.dump(dict(exp_name=exp_name or osp.basename(osp.normpath(out_dir))), f)
+
+    wall = time.time()
+    for name, values in metrics.items():
+        csv_path = osp.join(out_dir, name + '.csv')
+        row = pd.DataFrame(dict(Wall=[wall], Step=[step], Value=[np.nanmean(values) if len(values) else np.nan]))
+        row.to_csv(csv_path, mode='a', header=not osp.exists(csv_path), index=False)
+
+    table = pd.DataFrame(dict(Step=step, Episode=np.arange(len(next(iter(metrics.values()), []))), **metrics))
+    episodes_path = osp.join(out_dir, 'episodes.csv')
+    table.to_csv(episodes_path, mode='a', header=not osp.exists(episodes_path), index=False,
+                 float_format='%.6g')
+    return out_dir
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store')
+    parser.add_argument('--step', type=int, required=True)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--exp_name')
+    parser.add_argument('--temperature', type=float, default=1.0)
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+
+    metrics = evaluate_store(args.store, args.processes, args.temperature)
+    write_metrics(metrics, args.out, args.step, args.exp_name)
+    for name, values in metrics.items():
+        print('%-20s %.6g' % (name, np.nanmean(values)))
@@ -0,0 +1,183 @@
+"""Episode store -- 评估数据按 episode 存盘, 用 memmap 读取"""
+import inspect
+import json
+import os
+import os.path as osp
+from collections.abc import Mapping
+
+import numpy as np
+
+# Fields with one row per timestep, the viewers slice them to num
+STEP_FIELDS = ('left_points', 'right_points', 'left_act', 'right_act', 'left_q', 'right_q', 'q_arrays')
+
+
+class EpisodeWriter:
+    """
+    Append episodes to an on-disk store, one raw binary file per field.
+
+    Every field of every episode is written as soon as it is added, so
+    dumping an evaluation never holds more than one episode in memory.
+    Floating point fields are stored as float_dtype.
+
+    Usage:
+        with EpisodeWriter(path) as writer:
+            writer.add(left_points=..., right_points=..., left_act=..., q_arrays=...)
+    """
+
+    def __init__(self, path, float_dtype=np.float32):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.float_dtype = np.dtype(float_dtype)
+        self.files = {}
+        self.meta = {}
+        self.offsets = {}
+
+    def add(self, **fields):
+        """
+        Write one episode. Every field is checked before any byte is written,
+        so a rejected episode leaves the store as it was.
+        """
+        if self.files and set(fields) != set(self.files):
+            raise ValueError('every episode needs the fields ' + ', '.join(sorted(self.files)))
+        values = {}
+        for name, value in fields.items():
+            value = np.asarray(value)
+            if value.ndim == 0:
+                raise ValueError('%s needs one row per step, got a scalar' % name)
+            if value.dtype.kind == 'f':
+                value = value.astype(self.float_dtype)
+            if name in self.meta:
+                if value.shape[1:] != tuple(self.meta[name]['shape']):
+                    raise ValueError('%s has rows of shape %s, got %s'
+                                     % (name, tuple(self.meta[name]['shape']), value.shape[1:]))
+                if not np.can_cast(value.dtype, self.meta[name]['dtype'], casting='same_kind'):
+                    raise ValueError('%s is stored as %s, got %s' % (name, self.meta[name]['dtype'], value.dtype))
+            values[name] = value
+
+        for name, value in values.items():
+            if name not in self.files:
+                self.files[name] = open(osp.join(self.path, name + '.bin'), 'wb')
+                self.meta[name] = dict(dtype=value.dtype.str, shape=value.shape[1:])
+                self.offsets[name] = [0]
+            self.files[name].write(np.ascontiguousarray(value, dtype=self.meta[name]['dtype']).tobytes())
+            self.offsets[name].append(self.offsets[name][-1] + len(value))
+
+    def close(self):
+        """
+        Write the index of the episodes written completely, also after a failed add().
+        """
+        names = sorted(self.files)
+        for name in names:
+            self.files[name].close()
+        # 某个字段写入出错时, 只保留所有字段都写完的 episode
+        count = min((len(self.offsets[name]) for name in names), default=1)
+        index = np.array([self.offsets[name][:count] for name in names], dtype=np.int64).reshape(len(names), count)
+        np.save(osp.join(self.path, 'index.npy'), index)
+        with open(osp.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(dict(fields=names, meta=self.meta), f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_episodes(path, episodes, float_dtype=np.float32):
+    """
+    Store an iterable of episode dicts, see EpisodeWriter.
+    """
+    with EpisodeWriter(path, float_dtype) as writer:
+        for episode in episodes:
+            writer.add(**episode)
+
+
+class EpisodeStore:
+    """
+    Read-only view of a store written by EpisodeWriter.
+
+    Every field is an np.memmap over its whole file and index.npy holds the
+    row offsets of every episode, so store[i] only touches the pages of the
+    rows that are actually read.
+    """
+
+    def __init__(self, path):
+        with open(osp.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.index = dict(zip(meta['fields'], np.load(osp.join(path, 'index.npy'))))
+        self.fields = {}
+        for name in meta['fields']:
+            dtype = np.dtype(meta['meta'][name]['dtype'])
+            shape = (int(self.index[name][-1]),) + tuple(meta['meta'][name]['shape'])
+            if shape[0] == 0:
+                self.fields[name] = np.empty(shape, dtype=dtype)
+            else:
+                self.fields[name] = np.memmap(osp.join(path, name + '.bin'), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self):
+        # 一个 episode 都没写的 store 没有字段
+        if not self.index:
+            return 0
+        return len(next(iter(self.index.values()))) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('episode %d out of range' % i)
+        return Episode(self, i % len(self))
+
+
+class Episode(Mapping):
+    """
+    Handle of one episode, episode[name] is a memmap slice of that field.
+    """
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    def __getitem__(self, name):
+        offsets = self.store.index[name]
+        return self.store.fields[name][offsets[self.i]:offsets[self.i + 1]]
+
+    def __iter__(self):
+        return iter(self.store.fields)
+
+    def __len__(self):
+        return len(self.store.fields)
+
+    @property
+    def num(self):
+        """
+        Number of timesteps.
+        """
+        for name in STEP_FIELDS:
+            if name in self:
+                return len(self[name])
+        return 0
+
+
+def show_episode(episode, viewer, scene, num=None, **kwargs):
+    """
+    Call a show_* viewer with the fields of an episode handle.
+
+    Only the fields named in the viewer's signature are read, the per-step
+    ones only up to num. Extra keyword arguments go to the viewer.
+
+    Args:
+        episode: Episode from an EpisodeStore
+        viewer: e.g. show_q_value_discrete_mix
+        scene: dualarm or dualarmrod
+        num: points num, all the steps by default
+
+    Returns:
+        whatever the viewer returns
+
+    """
+    num = episode.num if num is None else min(num, episode.num)
+    args = {}
+    for name in inspect.signature(viewer).parameters:
+        if name in episode:
+            value = episode[name]
+            args[name] = np.asarray(value[:num] if name in STEP_FIELDS else value)
+    return viewer(num=num, scene=scene, **args, **kwargs)
@@ -0,0 +1,156 @@
+"""Batched glyphs -- 所有箭头合并成一个 mesh"""
+from functools import lru_cache
+
+from vedo import *
+
+
+def batched_arrows(start_pts, end_pts, scalars=None, color_list=None, c='orange', alpha=1.0):
+    """
+    Build every arrow as one glyph mesh instead of one ``Arrow`` actor per arrow.
+
+    Args:
+        start_pts: (n, 3) arrow origins
+        end_pts: (n, 3) arrow tips
+        scalars: (n,) optional per-arrow integer label, used as index into color_list
+        color_list: colours of the labels, e.g. ['', 'red', 'blue', ...]
+        c: single colour used when scalars is None
+        alpha: opacity
+
+    Returns:
+        one ``Arrows`` mesh, arrows of zero length are invisible
+
+    """
+    start_pts = np.asarray(start_pts, dtype=float).reshape(-1, 3)
+    end_pts = np.asarray(end_pts, dtype=float).reshape(-1, 3)
+    arrows = Arrows(start_pts, end_pts, c=c, alpha=alpha)
+    if scalars is None:
+        return arrows
+
+    # vtkGlyph3D 记录了每个输出点来自哪个输入点, 用它把 label 扩展到整个 glyph
+    scalars = np.asarray(scalars).ravel()
+    ids = arrows.pointdata["InputPointIds"]
+    arrows.pointdata["label"] = scalars[ids]
+    arrows.cmap(label_lut(tuple(color_list)), "label")
+    return arrows
+
+
+def vector_field(start_pts, vectors, scale=0.01, cmap='viridis', threshold=None, normalize=False,
+                 vmin=None, vmax=None, scalarbar=True, alpha=1.0):
+    """
+    Glyphs of (n, 3) vectors in one mesh, coloured by their magnitude.
+
+    Args:
+        start_pts: (n, 3) glyph origins
+        vectors: (n, 3) e.g. continuous actions
+        scale: glyph length per unit of magnitude, or the length of every glyph with normalize
+        cmap: color map of the magnitude
+        threshold: drop the vectors shorter than this magnitude
+        normalize: same length for every glyph, magnitude only shown by colour
+        vmin, vmax: colour range, the range of the drawn magnitudes by default
+        scalarbar: add a scalar bar of the magnitude
+        alpha: opacity
+
+    Returns:
+        one ``Arrows`` mesh with a "magnitude" point array, None if no vector is left
+
+    """
+    start_pts = np.asarray(start_pts, dtype=float).reshape(-1, 3)
+    vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
+    magnitude = np.linalg.norm(vectors, axis=1)
+    keep = np.isfinite(magnitude) if threshold is None else magnitude >= threshold
+    start_pts, vectors, magnitude = start_pts[keep], vectors[keep], magnitude[keep]
+    if len(magnitude) == 0:
+        return None
+
+    if normalize:
+        vectors = vectors / np.where(magnitude > 0, magnitude, 1)[:, None]
+    arrows = Arrows(start_pts, start_pts + vectors * scale, alpha=alpha)
+    arrows.pointdata["magnitude"] = magnitude[arrows.pointdata["InputPointIds"]]
+    arrows.cmap(cmap, "magnitude",
+                vmin=magnitude.min() if vmin is None else vmin,
+                vmax=magnitude.max() if vmax is None else vmax)
+    if scalarbar:
+        arrows.add_scalarbar(title='|action|')
+    return arrows
+
+
+@lru_cache(maxsize=None)
+def label_lut(color_list):
+    """
+    Lookup table mapping label i to color_list[i], built once per colour tuple.
+    """
+    return build_lut([(i, col if col else 'white') for i, col in enumerate(color_list)],
+                     vmin=0, vmax=len(color_list) - 1)
+
+
+def lod_indices(points, acts=None, lod=None):
+    """
+    Pick the timesteps whose glyphs are drawn, points and lines always keep every step.
+
+    Args:
+        points: (num, 3)
+        acts: (num,) or (num, k) actions, used by action_change
+        lod: None to keep every step, or a dict with any of
+            stride: keep every stride-th step
+            spacing: keep at most one step per `spacing` of arc length
+            action_change: keep only the steps whose action differs from the previous step
+
+    Returns:
+        sorted index array
+
+    """
+    points = np.asarray(points, dtype=float)
+    num = len(points)
+    if not lod:
+        return np.arange(num)
+
+    idx = np.arange(0, num, lod.get('stride', 1))
+    if lod.get('spacing'):
+        length = np.r_[0, np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))]
+        bins = np.floor(length[idx] / lod['spacing'])
+        idx = idx[np.r_[True, bins[1:] > bins[:-1]]]
+    if lod.get('action_change'):
+        acts = np.asarray(acts).reshape(num, -1)
+        changed = np.r_[True, np.any(acts[1:] != acts[:-1], axis=1)]
+        idx = idx[changed[idx]]
+    return idx
+
+
+class ArrowSlots:
+    """
+    A fixed number of arrows in one pre-allocated mesh.
+
+    Every arrow is a copy of the glyph of one of `directions`, update() moves,
+    scales and recolours them by overwriting the point and label arrays of
+    the same VTK objects, so players do not build new actors per frame.
+    """
+
+    def __init__(self, count, directions, color_list, labels=None):
+        directions = np.asarray(directions, dtype=float)
+        # 每个方向一个长度为 1 的箭头, 零向量的箭头所有点都在原点
+        template = batched_arrows(np.zeros((len(directions), 3)), directions, c='k3')
+        self.npts = template.npoints // len(directions)
+        self.templates = template.vertices.reshape(len(directions), self.npts, 3).astype(float)
+
+        self.mesh = batched_arrows(np.zeros((count, 3)), np.tile([[1., 0., 0.]], (count, 1)),
+                                   scalars=np.zeros(count, dtype=int) if labels is None else labels,
+                                   color_list=color_list)
+        self.vertices = self.mesh.vertices.reshape(count, self.npts, 3)
+        self.labels = self.mesh.pointdata["label"]
+
+    def update(self, origins, dirs, lengths, labels=None):
+        """
+        Args:
+            origins: (count, 3)
+            dirs: (count,) index into directions
+            lengths: scalar or (count,) arrow lengths
+            labels: optional (count,) colour labels
+        """
+        lengths = np.broadcast_to(np.asarray(lengths, dtype=float), (len(self.vertices),))
+        self.vertices[:] = (np.asarray(origins, dtype=float)[:, None]
+                            + lengths[:, None, None] * self.templates[np.asarray(dirs)])
+        self.mesh.dataset.GetPoints().Modified()
+        if labels is not None:
+            self.labels[:] = np.repeat(labels, self.npts)
+            self.mesh.dataset.GetPointData().GetArray("label").Modified()
+        self.mesh.dataset.Modified()
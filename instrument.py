@@ -0,0 +1,161 @@
+"""Instrument -- 可选的分阶段计时 / actor 计数 / 内存峰值
+
+Nothing is recorded unless a profile() is active, lap() then returns at once,
+so the instrumented viewers cost nothing in normal use.
+
+    with profile(cprofile=True) as report:
+        show_q_value_discrete_mix(..., batched=True, screenshot='still.png')
+    report.print()
+    report.save('report.json')
+
+A viewer opening a window counts the time the window stays open in its
+show stage, pass screenshot to time the offscreen render instead.
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_report = None
+
+
+class Report:
+    """
+    Stages recorded by lap() and the calls wrapped by instrumented, in the order they finished.
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stages = []
+        self.calls = []
+        self.stack = []
+        self.profiler = None
+
+    def summary(self):
+        """
+        Calls and stages of the same name added up, e.g. of q_matrix called once per step.
+
+        Returns:
+            list of dict(name, count, seconds, actors, peak_mb), calls first
+
+        """
+        rows = {}
+        for row in self.calls + self.stages:
+            total = rows.setdefault(row['name'], dict(name=row['name'], count=0, seconds=0.0))
+            total['count'] += 1
+            total['seconds'] += row['seconds']
+            if 'actors' in row:
+                total['actors'] = total.get('actors', 0) + row['actors']
+            if 'peak_mb' in row:
+                total['peak_mb'] = max(total.get('peak_mb', 0), row['peak_mb'])
+        return list(rows.values())
+
+    def to_dict(self):
+        return dict(summary=self.summary(), stages=self.stages, calls=self.calls)
+
+    def save(self, path):
+        """
+        Write the stages and calls as JSON, and the cProfile statistics next to it as <path>.prof.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        if self.profiler is not None:
+            self.profiler.dump_stats(path + '.prof')
+
+    def print(self, sort='cumulative', limit=20):
+        print('%-48s %8s %10s %8s %10s' % ('stage', 'count', 'seconds', 'actors', 'peak MB'))
+        for row in self.summary():
+            print('%-48s %8d %10.4f %8s %10s' % (row['name'], row['count'], row['seconds'], row.get('actors', ''),
+                                                 '%.1f' % row['peak_mb'] if 'peak_mb' in row else ''))
+        if self.profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+            print(stream.getvalue())
+
+
+@contextmanager
+def profile(cprofile=False, memory=True):
+    """
+    Record every lap() and instrumented call made inside the block.
+
+    Args:
+        cprofile: also run cProfile over the block
+        memory: trace the Python and NumPy allocations with tracemalloc, VTK memory is not traced
+
+    Yields:
+        the Report being filled
+
+    """
+    global _report
+    report, previous = Report(memory), _report
+    _report = report
+    # 外层已经在 trace 时不重复 start / stop
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if cprofile:
+        report.profiler = cProfile.Profile()
+        report.profiler.enable()
+    try:
+        yield report
+    finally:
+        if cprofile:
+            report.profiler.disable()
+        if started:
+            tracemalloc.stop()
+        _report = previous
+
+
+def count_actors(actors):
+    """
+    Number of actors in nested lists and tuples, None and empty lists count as 0.
+    """
+    if actors is None:
+        return 0
+    if isinstance(actors, (list, tuple)):
+        return sum(count_actors(actor) for actor in actors)
+    return 1
+
+
+def lap(name, *actors):
+    """
+    Close the current stage of the innermost instrumented call, a no-op without profile().
+
+    Args:
+        name: stage name, recorded as <function>.<name>
+        actors: the actors built in this stage, counted by count_actors
+    """
+    if _report is None or not _report.stack:
+        return
+    frame = _report.stack[-1]
+    now = time.perf_counter()
+    row = dict(name='%s.%s' % (frame['name'], name), seconds=now - frame['last'])
+    if actors:
+        row['actors'] = count_actors(list(actors))
+    if _report.memory:
+        row['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.reset_peak()
+    _report.stages.append(row)
+    frame['last'] = time.perf_counter()
+
+
+def instrumented(func):
+    """
+    Time every call of func while a profile() is active, lap() inside func records its stages.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _report is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        _report.stack.append(dict(name=func.__name__, last=start))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _report.stack.pop()
+            _report.calls.append(dict(name=func.__name__, seconds=time.perf_counter() - start))
+    return wrapper
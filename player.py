@@ -0,0 +1,113 @@
+"""Player -- 用滑块或左右方向键逐帧查看, 或离屏渲染成视频/图片"""
+import os
+import os.path as osp
+
+from vedo import *
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.gif', '.webm')
+
+
+def run_player(num, draw, actors, title='step', **show_kwargs):
+    """
+    Show actors with a timestep slider and keyboard stepping.
+
+    draw(i) must update the pre-allocated actors in place for timestep i,
+    the slider and the Left/Right (Home/End) keys only call draw and render.
+
+    Args:
+        num: number of timesteps
+        draw: callback updating the actors to timestep i
+        actors: everything to show, static and dynamic
+        title: slider title
+        show_kwargs: passed to Plotter.show, e.g. viewup, axes
+
+    """
+    plt = Plotter()
+    state = dict(step=0)
+
+    def goto(i):
+        state['step'] = int(np.clip(i, 0, num - 1))
+        draw(state['step'])
+        slider.value = state['step']
+        plt.render()
+
+    def on_slider(widget, event):
+        i = int(round(widget.value))
+        if i != state['step']:
+            goto(i)
+
+    def on_key(event):
+        steps = {'Right': 1, 'Left': -1, 'Up': 10, 'Down': -10}
+        if event.keypress in steps:
+            goto(state['step'] + steps[event.keypress])
+        elif event.keypress == 'Home':
+            goto(0)
+        elif event.keypress == 'End':
+            goto(num - 1)
+
+    slider = plt.add_slider(on_slider, 0, max(num - 1, 1), value=0, title=title)
+    plt.add_callback('key press', on_key)
+    draw(0)
+    plt.show(actors, **show_kwargs).close()
+
+
+def render_player(num, draw, actors, output, stride=1, size=(1280, 720), fps=24, **show_kwargs):
+    """
+    Offscreen counterpart of run_player, every stride-th timestep is drawn and written out.
+
+    Args:
+        num: number of timesteps
+        draw: callback updating the actors to timestep i
+        actors: everything to show, static and dynamic
+        output: a video file (.mp4, .gif, ..., written by vedo.Video, which needs
+            imageio or ffmpeg) or a directory for frame_%05d.png images
+        stride: step between rendered timesteps
+        size: frame size in pixels
+        fps: frames per second of a video
+        show_kwargs: passed to Plotter.show, e.g. viewup, axes
+
+    Returns:
+        list of written files
+
+    Raises:
+        RuntimeError: when no video was written, vedo.Video only logs a missing backend
+
+    """
+    plt = Plotter(offscreen=True, size=size)
+    video = None
+    if osp.splitext(output)[1].lower() in VIDEO_EXTENSIONS:
+        # 上次留下的同名视频不能当成这次写出的
+        stale = osp.getmtime(output) if osp.exists(output) else None
+        video = Video(output, fps=fps)
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    draw(0)
+    plt.show(actors, interactive=False, **show_kwargs)
+    paths = []
+    for i in range(0, num, stride):
+        draw(i)
+        plt.render()
+        if video is not None:
+            video.add_frame()
+        else:
+            paths.append(osp.join(output, 'frame_%05d.png' % i))
+            plt.screenshot(paths[-1])
+    if video is not None:
+        video.close()
+        paths = [output]
+    plt.close()
+    if video is not None and (not osp.exists(output) or osp.getmtime(output) == stale):
+        raise RuntimeError('no video was written to %s, vedo.Video needs imageio or ffmpeg' % output)
+    return paths
+
+
+def render_actors(actors, output, size=(1280, 720), **show_kwargs):
+    """
+    Offscreen still image of actors, e.g. of the tuple returned by show_trajectory_*.
+    """
+    plt = Plotter(offscreen=True, size=size)
+    plt.show(actors, interactive=False, **show_kwargs)
+    plt.screenshot(output)
+    plt.close()
+    return output
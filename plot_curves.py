@@ -1,41 +1,191 @@
 import seaborn as sns
 import pandas as pd
 import matplotlib.pyplot as plt
+import io
 import json
 import os
 import os.path as osp
+import hashlib
+import pickle
+import warnings
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from instrument import instrumented, lap, profile
 
 DIV_LINE_WIDTH = 50
 
+# On-disk cache of parsed runs and number of loader threads
+CACHE_DIR = osp.join(osp.expanduser('~'), '.cache', 'robotools', 'curves')
+WORKERS = 16
+# Columnar copy of a curve, see convert_run
+CURVE_DTYPE = np.dtype([('step', np.int64), ('value', np.float32)])
+# Defaults of the make_plots arguments of an export job
+JOB_DEFAULTS = dict(condition='Condition2', smooth=None, select=None, exclude=None, estimator='mean',
+                    cache_dir=CACHE_DIR, workers=WORKERS, columnar_dir=None, smoother='moving', band='sd',
+                    xlim=None, ylim=None)
+# smooth of each smoother when none is given
+SMOOTH_DEFAULTS = dict(moving=1, ema=0.6, steps=0)
+
 # Global vars for tracking and labeling data at load time.
 units = dict()
 
-def plot_data(data, performance, condition, smooth, estimator):
-    if smooth > 1:
-        """
-        smooth data with moving window average.
-        that is,
-            smoothed_y[t] = average(y[t-k], y[t-k+1], ..., y[t+k-1], y[t+k])
-        where the "smooth" param is width of that window (2k+1)
-        """
-        y = np.ones(smooth)
-        for datum in data:
-            x = np.asarray(datum[performance])
-            z = np.ones(len(x))
-            smoothed_x = np.convolve(x,y,'same') / np.convolve(z,y,'same')
-            datum[performance] = smoothed_x
+def moving_average(x, smooth):
+    """
+    smooth data with moving window average.
+    that is,
+        smoothed_y[t] = average(y[t-k], y[t-k+1], ..., y[t+k-1], y[t+k])
+    where the "smooth" param is width of that window (2k+1).
+    Same result as np.convolve(x, ones, 'same') / np.convolve(ones, ones, 'same'),
+    but O(n) with a cumulative sum whatever the window.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    csum = np.concatenate(([0.], np.cumsum(x)))
+    t = np.arange(n)
+    lo = np.maximum(t - smooth // 2, 0)
+    hi = np.minimum(t + (smooth - 1) // 2 + 1, n)
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def ema(x, weight):
+    """
+    TensorBoard-style exponential moving average with debiasing,
+        last = weight * last + (1 - weight) * y[t]
+        smoothed_y[t] = last / (1 - weight ** (t + 1))
+    The recursion is solved in closed form blockwise, blocks are short enough
+    that weight ** -block stays well inside float64 precision.
+    """
+    if not 0 <= weight < 1:
+        raise ValueError('ema weight must be in [0, 1), got %r' % (weight,))
+    x = np.asarray(x, dtype=np.float64)
+    if weight == 0 or len(x) == 0:
+        return x.copy()
+    block = max(1, int(np.log(1e-8) / np.log(weight)))
+    out = np.empty_like(x)
+    last = 0.
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        k = np.arange(len(chunk))
+        # s[k] = last * w^(k+1) + (1-w) * sum_{j<=k} w^(k-j) * x[j]
+        out[start:start + len(chunk)] = (last * weight ** (k + 1)
+                                         + (1 - weight) * weight ** k * np.cumsum(chunk * weight ** -k))
+        last = out[start + len(chunk) - 1]
+    return out / (1 - weight ** np.arange(1, len(x) + 1))
+
+
+def step_window_average(steps, x, window):
+    """
+    Average over the samples whose step lies within window/2 of each step,
+    so runs logged at irregular steps are smoothed over the same training time.
+    """
+    steps = np.asarray(steps)
+    x = np.asarray(x, dtype=np.float64)
+    order = np.argsort(steps, kind='stable')
+    sorted_steps = steps[order]
+    csum = np.concatenate(([0.], np.cumsum(x[order])))
+    lo = np.searchsorted(sorted_steps, sorted_steps - window / 2, side='left')
+    hi = np.searchsorted(sorted_steps, sorted_steps + window / 2, side='right')
+    out = np.empty_like(x)
+    out[order] = (csum[hi] - csum[lo]) / (hi - lo)
+    return out
+
 
+def smooth_curve(steps, x, smooth, smoother='moving'):
+    """
+    smoother:
+        'moving': centered moving average over `smooth` samples
+        'ema': exponential moving average with weight `smooth` in [0, 1)
+        'steps': moving average over a window of `smooth` steps
+    smooth=None takes the default of the smoother, see SMOOTH_DEFAULTS.
+    """
+    if smooth is None:
+        smooth = SMOOTH_DEFAULTS.get(smoother, 1)
+    if smoother == 'moving':
+        return moving_average(x, int(smooth))
+    if smoother == 'ema':
+        return ema(x, smooth)
+    if smoother == 'steps':
+        return step_window_average(steps, x, smooth)
+    raise ValueError("'moving', 'ema' or 'steps' PLZ")
+
+
+def aggregate_runs(data, value, condition, estimator=np.mean, band='sd', resolution=1000):
+    """
+    Interpolate every run (one Condition2) onto a shared step grid and
+    aggregate the runs of each condition in one pass over a (runs, grid) matrix.
+    Outside its own step range a run is NaN, so it does not pull the others.
+
+    Args:
+        data: concatenated DataFrame with 'steps', value, condition and 'Condition2'
+        value: column to aggregate
+        condition: column grouping the runs, e.g. 'Condition1'
+        estimator: np.mean, np.median, ... the NaN-aware version is used when NumPy has one
+        band: 'sd' for estimator +- std, a (low, high) percentile pair, or None
+        resolution: number of grid points
+
+    Returns:
+        grid, {condition: (center, low, high)}
+
+    """
+    steps = data['steps'].to_numpy()
+    values = data[value].to_numpy(dtype=np.float64)
+    grid = np.linspace(steps.min(), steps.max(), resolution)
+    estimator = getattr(np, 'nan' + estimator.__name__, estimator)
+
+    runs = data.groupby([condition, 'Condition2'], sort=False).indices
+    curves = {}
+    for (cond, _), index in runs.items():
+        order = index[np.argsort(steps[index], kind='stable')]
+        curves.setdefault(cond, []).append(np.interp(grid, steps[order], values[order],
+                                                     left=np.nan, right=np.nan))
+
+    result = {}
+    with warnings.catch_warnings():
+        # 某些网格点上没有任何 run 时 nan* 会警告
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for cond, rows in curves.items():
+            rows = np.stack(rows)
+            center = estimator(rows, axis=0)
+            if band == 'sd':
+                std = np.nanstd(rows, axis=0)
+                low, high = center - std, center + std
+            elif band is None:
+                low = high = None
+            else:
+                low, high = np.nanpercentile(rows, band, axis=0)
+            result[cond] = (center, low, high)
+    return grid, result
+
+
+def plot_data(data, performance, condition, smooth, estimator, smoother='moving', band='sd', resolution=1000,
+              xlim=None, ylim=None):
     if isinstance(data, list):
         data = pd.concat(data, ignore_index=True)
+    else:
+        data = data.copy()
+
+    value = performance
+    if smooth is None:
+        smooth = SMOOTH_DEFAULTS.get(smoother, 1)
+    if smooth > 1 or (smoother != 'moving' and smooth > 0):
+        # 平滑结果写到新的一列, 不改动加载的数据
+        value = 'smoothed_' + performance
+        smoothed = np.empty(len(data))
+        for _, index in data.groupby('Condition2', sort=False).indices.items():
+            smoothed[index] = smooth_curve(data['steps'].to_numpy()[index],
+                                           data[performance].to_numpy()[index], smooth, smoother)
+        data[value] = smoothed
+
     sns.set(style="darkgrid", font_scale=1.5)
-    sns.tsplot(data=data, time='steps', value=performance, unit="Unit", condition=condition, ci='sd', estimator=estimator)
-    """
-    If you upgrade to any version of Seaborn greater than 0.8.1, switch from 
-    tsplot to lineplot replacing L29 with:
-        sns.lineplot(data=data, x='steps', y=performance, hue=condition, ci='sd', estimator=estimator)
-    Changes the colorscheme and the default legend style, though.
-    """
+    grid, curves = aggregate_runs(data, value, condition, estimator, band, resolution)
+    for i, (cond, (center, low, high)) in enumerate(curves.items()):
+        color = 'C%d' % i
+        plt.plot(grid, center, c=color, label=cond)
+        if low is not None:
+            plt.fill_between(grid, low, high, color=color, alpha=0.2, linewidth=0)
+    plt.xlabel('steps')
+    plt.ylabel(performance)
     plt.legend(loc='best').set_draggable(True)
     #plt.legend(loc='upper center', ncol=3, handlelength=1,
     #           borderaxespad=0., prop={'size': 13})
@@ -53,49 +203,174 @@ def plot_data(data, performance, condition, smooth, estimator):
         plt.ticklabel_format(style='sci', axis='x', scilimits=(0,0))
 
     plt.tight_layout(pad=0.5)
-    plt.xlim(0, 25e6)
-    plt.ylim(0, 900)
+    if xlim is not None:
+        plt.xlim(*xlim)
+    if ylim is not None:
+        plt.ylim(*ylim)
+
+def find_runs(logdir):
+    """
+    Every directory under logdir that holds a config.json, in os.walk order.
+    """
+    return [root for root, _, files in os.walk(logdir) if 'config.json' in files]
+
+
+def read_exp_name(config_path):
+    exp_name = None
+    try:
+        with open(config_path) as f:
+            config = json.load(f)
+        if 'exp_name' in config:
+            exp_name = config['exp_name']
+    except:
+        print('No file named config.json')
+    return exp_name
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def columnar_path(csv_path, columnar_dir=None):
+    """
+    Columnar copy of a curve csv: next to it, or under a hash of its path in columnar_dir.
+    """
+    if columnar_dir is None:
+        return osp.splitext(csv_path)[0] + '.npy'
+    key = hashlib.sha1(osp.abspath(csv_path).encode()).hexdigest()
+    return osp.join(columnar_dir, key + '.npy')
+
 
-def get_datasets(logdir, performance):
+def convert_run(csv_path, columnar_dir=None):
+    """
+    Store the Step/Value columns of a curve csv as a structured .npy
+    (int64 steps, float32 values), which read_run memory-maps instead of parsing.
+    """
+    exp_data = pd.read_csv(csv_path, usecols=['Step', 'Value'])
+    curve = np.empty(len(exp_data), dtype=CURVE_DTYPE)
+    curve['step'] = exp_data['Step']
+    curve['value'] = exp_data['Value']
+
+    npy_path = columnar_path(csv_path, columnar_dir)
+    os.makedirs(osp.dirname(npy_path) or '.', exist_ok=True)
+    tmp_path = npy_path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.save(f, curve)
+    os.replace(tmp_path, npy_path)
+    return npy_path
+
+
+def convert_runs(all_logdirs, performance, columnar_dir=None, workers=WORKERS):
+    """
+    Opt-in conversion of every run under all_logdirs whose columnar copy is missing or stale.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        roots = sum(pool.map(find_runs, resolve_logdirs(all_logdirs)), [])
+        csv_paths = [os.path.join(root, performance+'.csv') for root in roots]
+        stale = [path for path in csv_paths if read_columnar(path, columnar_dir) is None]
+        return list(pool.map(lambda path: convert_run(path, columnar_dir), stale))
+
+
+def read_columnar(csv_path, columnar_dir=None):
+    """
+    Memory-map the columnar copy of csv_path, None if there is none or it is older than the csv.
+    """
+    npy_path = columnar_path(csv_path, columnar_dir)
+    try:
+        if file_stamp(npy_path)[0] < file_stamp(csv_path)[0]:
+            return None
+    except OSError:
+        return None
+    curve = np.load(npy_path, mmap_mode='r')
+    return pd.DataFrame({'Step': curve['step'], 'Value': curve['value']})
+
+
+def read_run(root, performance, cache_dir=CACHE_DIR, columnar_dir=None):
+    """
+    Read the exp_name and the raw <performance>.csv of one run.
+
+    A fresh columnar copy (see convert_run) is memory-mapped instead of parsing the csv.
+    Otherwise the result is pickled in cache_dir under a hash of the csv path, together
+    with the mtime and size of config.json and the csv. A later call only
+    re-reads the files when one of them changed. cache_dir=None disables the cache.
+    """
+    config_path = os.path.join(root, 'config.json')
+    csv_path = os.path.join(root, performance+'.csv')
+    stamp = (file_stamp(config_path), file_stamp(csv_path))
+
+    exp_data = read_columnar(csv_path, columnar_dir)
+    if exp_data is not None:
+        return read_exp_name(config_path), exp_data
+
+    cache_path = None
+    if cache_dir is not None:
+        key = hashlib.sha1(osp.abspath(csv_path).encode()).hexdigest()
+        cache_path = osp.join(cache_dir, key + '.pkl')
+        try:
+            with open(cache_path, 'rb') as f:
+                entry = pickle.load(f)
+            if entry['stamp'] == stamp:
+                return entry['exp_name'], entry['data']
+        except Exception:
+            # 读不了的缓存 (旧版本 pandas 的 pickle 之类) 当作没有缓存
+            pass
+
+    exp_name = read_exp_name(config_path)
+    exp_data = pd.read_csv(csv_path)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(dict(stamp=stamp, exp_name=exp_name, data=exp_data), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return exp_name, exp_data
+
+
+def make_dataset(exp_name, exp_data, performance):
+    """
+    Label one run with its Unit/Condition columns, runs of the same exp_name are numbered in call order.
+    """
+    global units
+    # condition1 对于同一种算法的不同实验取平均值
+    condition1 = exp_name
+    # condition2 对于同一种算法的不同实验都绘制一条曲线
+    if exp_name not in units:
+        units[condition1] = 0
+    units[exp_name] += 1
+    condition2 = exp_name + '-' + str(units[exp_name])
+
+    # 一次性构造所有列, 不逐列 insert
+    columns = {column: exp_data[column].to_numpy() for column in exp_data.columns}
+    columns.update({'Unit': units[exp_name],
+                    'Condition1': condition1,
+                    'Condition2': condition2,
+                    'steps': columns['Step'],
+                    performance: columns['Value']})
+    return pd.DataFrame(columns)
+
+
+def load_runs(roots, performance, cache_dir=CACHE_DIR, workers=WORKERS, columnar_dir=None):
+    """
+    Read many runs with a thread pool, the files are mostly waiting on (network) disk.
+    Units are assigned afterwards in the order of roots, so numbering does not depend on timing.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(lambda root: read_run(root, performance, cache_dir, columnar_dir), roots))
+    return [make_dataset(exp_name, exp_data, performance) for exp_name, exp_data in runs]
+
+
+def get_datasets(logdir, performance, cache_dir=CACHE_DIR, workers=WORKERS, columnar_dir=None):
     """
     Recursively look through logdir for output files produced by
     spinup.logx.Logger. 
-    Assumes that any file "progress.txt" is a valid hit. 
+    Assumes that any directory holding a "config.json" is a valid hit. 
     """
-    global units
-    datasets = []
-    for root, _, files in os.walk(logdir):
-        if 'config.json' in files:
-            exp_name = None
-            try:
-                config_path = open(os.path.join(root,'config.json'))
-                config = json.load(config_path)
-                if 'exp_name' in config:
-                    exp_name = config['exp_name']
-            except:
-                print('No file named config.json')
-
-            # condition1 对于同一种算法的不同实验取平均值
-            condition1 = exp_name
-            # condition2 对于同一种算法的不同实验都绘制一条曲线
-            if exp_name not in units:
-                units[condition1] = 0
-            units[exp_name] += 1
-            condition2 = exp_name + '-' + str(units[exp_name])
-
-            exp_data = pd.read_csv(os.path.join(root, performance+'.csv'))
-
-            exp_data.insert(len(exp_data.columns), 'Unit', units[exp_name])
-            exp_data.insert(len(exp_data.columns), 'Condition1', condition1)
-            exp_data.insert(len(exp_data.columns), 'Condition2', condition2)
-            exp_data.insert(len(exp_data.columns), 'steps', exp_data['Step'])
-            exp_data.insert(len(exp_data.columns), performance, exp_data['Value'])
-            datasets.append(exp_data)
-            
-    return datasets
-
-
-def get_all_datasets(all_logdirs, performance, select, exclude):
+    return load_runs(find_runs(logdir), performance, cache_dir, workers, columnar_dir)
+
+
+def resolve_logdirs(all_logdirs, select=None, exclude=None):
     """
     For every entry in all_logdirs,
         1) check if the entry is a real directory and if it is, 
@@ -123,6 +398,15 @@ def get_all_datasets(all_logdirs, performance, select, exclude):
         logdirs = [log for log in logdirs if all(x in log for x in select)]
     if exclude is not None:
         logdirs = [log for log in logdirs if all(not(x in log) for x in exclude)]
+    return logdirs
+
+
+def get_all_datasets(all_logdirs, performance, select, exclude, cache_dir=CACHE_DIR, workers=WORKERS,
+                     columnar_dir=None):
+    """
+    Load every run under the logdirs resolved by resolve_logdirs.
+    """
+    logdirs = resolve_logdirs(all_logdirs, select, exclude)
 
     # Verify logdirs
     print('Plotting from...\n' + '='*DIV_LINE_WIDTH + '\n')
@@ -130,44 +414,274 @@ def get_all_datasets(all_logdirs, performance, select, exclude):
         print(logdir)
     print('\n' + '='*DIV_LINE_WIDTH)
 
-    # Load data from logdirs
-    data = []
-    for log in logdirs:
-        data += get_datasets(log, performance)
-    return data
+    # Load data from logdirs, directories are scanned and files parsed concurrently
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        roots = sum(pool.map(find_runs, logdirs), [])
+    return load_runs(roots, performance, cache_dir, workers, columnar_dir)
+
 
+class CurveTail:
+    """
+    Follow one <performance>.csv while training appends to it.
+
+    The byte offset of the last complete row is kept, so every poll only reads
+    and parses the rows appended since the previous one.
+    """
 
-def make_plots(all_logdirs, performance, condition, smooth, select, exclude, estimator):
-    data = get_all_datasets(all_logdirs, performance, select, exclude)
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.offset = 0
+        self.columns = None
+        self.steps = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=np.float32)
+
+    def poll(self):
+        """
+        Read the newly appended complete rows, returns True if there were any.
+        """
+        try:
+            size = os.stat(self.csv_path).st_size
+        except OSError:
+            return False
+        if size < self.offset:
+            # 文件被重写, 从头读
+            self.__init__(self.csv_path)
+        if size == self.offset:
+            return False
+
+        with open(self.csv_path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        # 最后一行可能还没写完, 留到下次
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return False
+        self.offset += end
+        chunk = chunk[:end]
+        if self.columns is None:
+            header, _, chunk = chunk.partition(b'\n')
+            names = [name.strip().strip('"') for name in header.decode().split(',')]
+            self.columns = [names.index('Step'), names.index('Value')]
+        if not chunk.strip():
+            return False
+
+        rows = pd.read_csv(io.BytesIO(chunk), header=None, usecols=self.columns)
+        self.steps = np.concatenate((self.steps, rows[self.columns[0]].to_numpy(np.int64)))
+        self.values = np.concatenate((self.values, rows[self.columns[1]].to_numpy(np.float32)))
+        return True
+
+
+def live_plots(all_logdirs, performance, select=None, exclude=None, interval=5000, rescan=12):
+    """
+    Plot every run as its own line and keep following the csv files during training.
+
+    A matplotlib timer polls the runs every `interval` ms and updates the
+    existing lines in place. The logdirs are scanned again every `rescan`
+    polls to pick up runs started later. Runs of the same exp_name share a colour.
+    """
+    sns.set(style="darkgrid", font_scale=1.5)
+    fig, ax = plt.subplots()
+    tails = {}
+    lines = {}
+    colors = {}
+    polls = [0]
+
+    def add_runs():
+        for root in sum(map(find_runs, resolve_logdirs(all_logdirs, select, exclude)), []):
+            if root in tails:
+                continue
+            exp_name = read_exp_name(os.path.join(root, 'config.json'))
+            label = None
+            if exp_name not in colors:
+                colors[exp_name] = 'C%d' % len(colors)
+                label = exp_name
+            tails[root] = CurveTail(os.path.join(root, performance+'.csv'))
+            lines[root], = ax.plot([], [], c=colors[exp_name], label=label)
+        ax.legend(loc='best').set_draggable(True)
+
+    def update():
+        if polls[0] % rescan == 0:
+            add_runs()
+        polls[0] += 1
+        changed = [root for root, tail in tails.items() if tail.poll()]
+        for root in changed:
+            lines[root].set_data(tails[root].steps, tails[root].values)
+        if changed:
+            ax.relim()
+            ax.autoscale_view()
+            if max(tail.steps[-1] for tail in tails.values() if len(tail.steps)) > 5e3:
+                ax.ticklabel_format(style='sci', axis='x', scilimits=(0,0))
+            fig.canvas.draw_idle()
+
+    ax.set_xlabel('steps')
+    ax.set_ylabel(performance)
+    update()
+    timer = fig.canvas.new_timer(interval=interval)
+    timer.add_callback(update)
+    timer.start()
+    plt.show()
+
+
+@instrumented
+def make_plots(all_logdirs, performance, condition, smooth, select, exclude, estimator,
+               cache_dir=CACHE_DIR, workers=WORKERS, columnar_dir=None, smoother='moving', band='sd',
+               xlim=None, ylim=None):
+    data = get_all_datasets(all_logdirs, performance, select, exclude, cache_dir, workers, columnar_dir)
+    lap('load')
     estimator = getattr(np, estimator)      # choose what to show on main curve: mean? max? min?
     plt.figure()
-    plot_data(data, performance, condition, smooth, estimator)
+    plot_data(data, performance, condition, smooth, estimator, smoother, band, xlim=xlim, ylim=ylim)
+    lap('plot_data', plt.gca().lines, plt.gca().collections)
     plt.show()
+    lap('show')
+
+
+def export_plot(job, out_dir='.', formats=('png',)):
+    """
+    Render one figure without a display and save it once per format.
+
+    job is a dict of make_plots arguments plus an optional 'name' for the
+    output files, missing arguments take the make_plots defaults.
+    Returns the written paths.
+    """
+    plt.switch_backend('Agg')
+    # 每张图的 Condition2 编号都从 1 开始
+    units.clear()
+    job = dict(JOB_DEFAULTS, **job)
+    name = job.pop('name', None) or job['performance']
+
+    data = get_all_datasets(job['all_logdirs'], job['performance'], job['select'], job['exclude'],
+                            job['cache_dir'], job['workers'], job['columnar_dir'])
+    fig = plt.figure()
+    plot_data(data, job['performance'], job['condition'], job['smooth'], getattr(np, job['estimator']),
+              job['smoother'], job['band'], xlim=job['xlim'], ylim=job['ylim'])
+    paths = []
+    os.makedirs(out_dir, exist_ok=True)
+    for fmt in formats:
+        paths.append(osp.join(out_dir, name + '.' + fmt))
+        fig.savefig(paths[-1])
+    plt.close(fig)
+    return paths
+
+
+def export_plots(jobs, out_dir='.', formats=('png',), processes=None):
+    """
+    Render many figures in a process pool, every worker has its own Agg canvas.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(export_plot, job, out_dir, formats) for job in jobs]
+        return [future.result() for future in futures]
 
 
 if __name__ == "__main__":
+    import argparse
+    from contextlib import nullcontext
+    parser = argparse.ArgumentParser()
+    parser.add_argument('logdir', nargs='*')
+    parser.add_argument('--performance', '-p', default='reward')
+    parser.add_argument('--condition', '-c', default='Condition2')
+    parser.add_argument('--smooth', '-s', type=float)
+    parser.add_argument('--smoother', default='moving')
+    parser.add_argument('--band', default='sd')
+    parser.add_argument('--select', nargs='*')
+    parser.add_argument('--exclude', nargs='*')
+    parser.add_argument('--est', default='mean')
+    parser.add_argument('--xlim', type=float, nargs=2)
+    parser.add_argument('--ylim', type=float, nargs=2)
+    parser.add_argument('--cache_dir', default=CACHE_DIR)
+    parser.add_argument('--no_cache', action='store_true')
+    parser.add_argument('--columnar_dir')
+    parser.add_argument('--jobs')
+    parser.add_argument('--out', '-o')
+    parser.add_argument('--formats', nargs='*', default=['png'])
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--profile')
+    parser.add_argument('--convert', action='store_true')
+    parser.add_argument('--live', action='store_true')
+    parser.add_argument('--interval', type=int, default=5000)
+    args = parser.parse_args()
     """
-        all_logdirs (string list): As many log directories (or prefixes to log 
+        logdir (strings): As many log directories (or prefixes to log 
             directories, which the plotter will autocomplete internally) as 
             you'd like to plot from.
         performance (string): 'reward' or 'success_rate'
-        condition: Optional flag. By default, the plotter shows y-values which
-            are averaged across all results that share an ``exp_name``, 
-            which is typically a set of identical experiments that only vary
-            in random seed. But if you'd like to see all of those curves 
-            separately, use the ``--condition`` flag.
+        condition: Optional flag. By default, the plotter shows every run
+            as its own curve, like the make_plots call this entry point
+            replaced. To average the y-values across all results that share
+            an ``exp_name``, which is typically a set of identical experiments
+            that only vary in random seed, use ``--condition Condition1``.
         smooth (int): Smooth data by averaging it over a fixed window. This 
             parameter says how wide the averaging window will be.
+        smoother (string): 'moving' (window in samples), 'ema' (smooth is the
+            weight in [0, 1), like TensorBoard) or 'steps' (window in steps).
+            Without --smooth each smoother takes its SMOOTH_DEFAULTS value,
+            1 for 'moving' (no smoothing) and 0.6 for 'ema'.
+        band (string): Shaded band around the main curve, 'sd' for
+            +- one standard deviation, 'low,high' percentiles, or 'none'.
         select (strings): Optional selection rule: the plotter will only show
             curves from logdirs that contain all of these substrings.
         exclude (strings): Optional exclusion rule: plotter will only show 
             curves from logdirs that do not contain these substrings.
+        est (string): estimator of the main curve, any numpy reduction name.
+        xlim, ylim (2 floats): Optional axis limits, autoscaled by default.
+        cache_dir (string): Where parsed runs are cached between invocations,
+            --no_cache disables the cache.
+        columnar_dir (string): Where convert_runs stored the columnar copies
+            of the curves, by default next to each csv.
+        jobs (string): Optional json file with a list of jobs, every job is a
+            dict of make_plots arguments plus a 'name', the command line
+            values are the defaults of every job.
+        out (string): Write the figures to this directory with a non-interactive
+            backend instead of showing them.
+        formats (strings): File formats of the written figures, e.g. png pdf svg.
+        processes (int): Number of processes rendering the figures.
+        profile (string): Time the stages of make_plots with cProfile and
+            write the report to this json file, see instrument.profile.
+        convert: Write the columnar copies of the runs, to --columnar_dir or
+            next to each csv, and exit, see convert_runs.
+        live: Follow the runs during training, every run is its own line
+            updated in place, see live_plots.
+        interval (int): With --live, milliseconds between two polls of the csv files.
     """
+    if args.band == 'none':
+        band = None
+    elif ',' in args.band:
+        band = tuple(float(q) for q in args.band.split(','))
+    else:
+        band = args.band
+    cli_job = dict(all_logdirs=args.logdir,
+                   performance=args.performance,
+                   condition=args.condition,
+                   smooth=args.smooth,
+                   smoother=args.smoother,
+                   band=band,
+                   select=args.select,
+                   exclude=args.exclude,
+                   estimator=args.est,
+                   xlim=args.xlim,
+                   ylim=args.ylim,
+                   cache_dir=None if args.no_cache else args.cache_dir,
+                   columnar_dir=args.columnar_dir)
+
+    if args.jobs is None:
+        jobs = [cli_job]
+    else:
+        with open(args.jobs) as f:
+            jobs = [dict(cli_job, **job) for job in json.load(f)]
 
-    make_plots(all_logdirs=["/mnt/c/Users/33136/Documents/mydocuments/data/assemble"],  
-               performance='reward',
-               condition='Condition2', 
-               smooth=1, 
-               select=None, 
-               exclude=None,
-               estimator='mean')
+    if args.convert:
+        for path in convert_runs(args.logdir, args.performance, args.columnar_dir):
+            print(path)
+    elif args.live:
+        live_plots(args.logdir, args.performance, args.select, args.exclude, args.interval)
+    elif args.out is None:
+        with profile(cprofile=True) if args.profile else nullcontext() as report:
+            for job in jobs:
+                job.pop('name', None)
+                make_plots(**job)
+        if args.profile:
+            report.print()
+            report.save(args.profile)
+    else:
+        for paths in export_plots(jobs, args.out, args.formats, args.processes):
+            print('\n'.join(paths))
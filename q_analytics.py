@@ -0,0 +1,136 @@
+"""Joint Q analytics -- (num, 7, 7) joint Q 的批量统计
+
+Rows of a joint Q matrix are the actions of the left arm, columns the
+actions of the right arm, see show_q_value_discrete_mix. Every function
+takes (..., 7, 7) arrays, so one episode (num, 7, 7) and a padded batch of
+episodes (B, num, 7, 7) work the same way.
+"""
+import numpy as np
+
+
+def greedy_joint(q_arrays):
+    """
+    Greedy joint action of every step.
+
+    Returns:
+        left: (...,) left arm action
+        right: (...,) right arm action
+        value: (...,) joint Q of the greedy action
+
+    """
+    q_arrays = np.asarray(q_arrays)
+    flat = q_arrays.reshape(q_arrays.shape[:-2] + (-1,))
+    best = np.argmax(flat, axis=-1)
+    left, right = np.unravel_index(best, q_arrays.shape[-2:])
+    return left, right, np.take_along_axis(flat, best[..., None], axis=-1)[..., 0]
+
+
+def marginals(q_arrays):
+    """
+    Per-arm marginals, the mean over the actions of the other arm.
+
+    Returns:
+        left: (..., 7)
+        right: (..., 7)
+
+    """
+    q_arrays = np.asarray(q_arrays)
+    return q_arrays.mean(axis=-1), q_arrays.mean(axis=-2)
+
+
+def max_marginals(q_arrays):
+    """
+    Per-arm max-marginals, the best joint Q reachable with every action of one arm.
+
+    Returns:
+        left: (..., 7)
+        right: (..., 7)
+
+    """
+    q_arrays = np.asarray(q_arrays)
+    return q_arrays.max(axis=-1), q_arrays.max(axis=-2)
+
+
+def action_gap(q_arrays):
+    """
+    Best minus second best joint Q of every step, a small gap is an ambiguous choice.
+    """
+    q_arrays = np.asarray(q_arrays)
+    flat = q_arrays.reshape(q_arrays.shape[:-2] + (-1,))
+    top = -np.partition(-flat, 1, axis=-1)
+    return top[..., 0] - top[..., 1]
+
+
+def joint_q_stats(q_arrays, left_q=None, right_q=None):
+    """
+    Every statistic of a joint Q tensor in one pass.
+
+    Args:
+        q_arrays: (..., 7, 7) joint Q
+        left_q: optional (..., 7) local Q of the left arm
+        right_q: optional (..., 7) local Q of the right arm
+
+    Returns:
+        dict of NumPy arrays
+            left_greedy, right_greedy, greedy_value: greedy joint action and its Q
+            gap: best minus second best joint Q
+            left_marginal, right_marginal: (..., 7) mean marginals
+            left_max_marginal, right_max_marginal: (..., 7) max-marginals
+            left_marginal_agree, right_marginal_agree: greedy joint action equals the argmax of the mean marginal
+        and with left_q / right_q
+            left_local_agree, right_local_agree: greedy joint action equals the argmax of the local Q
+            local_agree: both arms agree
+
+    """
+    q_arrays = np.asarray(q_arrays)
+    left, right, value = greedy_joint(q_arrays)
+    left_marginal, right_marginal = marginals(q_arrays)
+    left_max_marginal, right_max_marginal = max_marginals(q_arrays)
+    stats = dict(left_greedy=left,
+                 right_greedy=right,
+                 greedy_value=value,
+                 gap=action_gap(q_arrays),
+                 left_marginal=left_marginal,
+                 right_marginal=right_marginal,
+                 left_max_marginal=left_max_marginal,
+                 right_max_marginal=right_max_marginal,
+                 left_marginal_agree=np.argmax(left_marginal, axis=-1) == left,
+                 right_marginal_agree=np.argmax(right_marginal, axis=-1) == right)
+    if left_q is not None:
+        stats['left_local_agree'] = np.argmax(np.asarray(left_q), axis=-1) == left
+    if right_q is not None:
+        stats['right_local_agree'] = np.argmax(np.asarray(right_q), axis=-1) == right
+    if left_q is not None and right_q is not None:
+        stats['local_agree'] = stats['left_local_agree'] & stats['right_local_agree']
+    return stats
+
+
+def episode_summary(stats, valid=None, gap_threshold=1e-3):
+    """
+    Reduce the per-step statistics of a batch of episodes to one row per episode.
+
+    Args:
+        stats: joint_q_stats of (B, num, 7, 7)
+        valid: optional (B, num) mask of the real steps of padded episodes
+        gap_threshold: steps with a smaller gap count as ambiguous
+
+    Returns:
+        dict of (B,) arrays
+            mean_gap, ambiguous: mean gap and fraction of ambiguous steps
+            marginal_agree: fraction of steps where both arms agree with their mean marginal
+            local_agree: fraction of steps where both arms agree with their local Q, if available
+
+    """
+    gap = stats['gap']
+    valid = np.ones(gap.shape, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    count = np.maximum(valid.sum(axis=-1), 1)
+
+    def fraction(mask):
+        return np.sum(mask & valid, axis=-1) / count
+
+    summary = dict(mean_gap=np.sum(np.where(valid, gap, 0), axis=-1) / count,
+                   ambiguous=fraction(gap < gap_threshold),
+                   marginal_agree=fraction(stats['left_marginal_agree'] & stats['right_marginal_agree']))
+    if 'local_agree' in stats:
+        summary['local_agree'] = fraction(stats['local_agree'])
+    return summary
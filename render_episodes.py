@@ -0,0 +1,96 @@
+"""Render episodes -- 离屏批量渲染 episode 成视频/图片"""
+import os
+import os.path as osp
+from concurrent.futures import ProcessPoolExecutor
+
+import show_q_value_discrete
+import show_q_value_discrete_mix
+import show_trajectory
+from episode_store import EpisodeStore, show_episode
+from player import render_actors
+
+# Offscreen viewers by name, players write videos or frame directories, show_* write stills,
+# show_trajectory_* return their actors, which render_actors writes as stills
+VIEWERS = {
+    'play_q_value_discrete': (show_q_value_discrete.play_q_value_discrete, 'output'),
+    'play_q_value_discrete_mix': (show_q_value_discrete_mix.play_q_value_discrete_mix, 'output'),
+    'show_q_value_discrete': (show_q_value_discrete.show_q_value_discrete, 'screenshot'),
+    'show_q_value_discrete_mix': (show_q_value_discrete_mix.show_q_value_discrete_mix, 'screenshot'),
+    'show_trajectory_discrete': (show_trajectory.show_trajectory_discrete, 'render'),
+    'show_trajectory_continuous': (show_trajectory.show_trajectory_continuous, 'render'),
+}
+
+
+def render_episode(store_path, i, viewer, output, scene, **kwargs):
+    """
+    Render episode i of a store with one of VIEWERS, in the calling process.
+
+    Every call opens its own memmap of the store and its own offscreen
+    plotter, so it can run in a worker process. Episodes without
+    left_points_ref / right_points_ref get the stock reference trajectories
+    of the scene, see trajectory_generation.REFERENCE_CONTROL_POINTS.
+    """
+    func, target = VIEWERS[viewer]
+    episode = EpisodeStore(store_path)[i]
+    if target != 'render':
+        show_episode(episode, func, scene, **{target: output}, **kwargs)
+        return output
+
+    if 'left_points_ref' not in episode and 'left_points_ref' not in kwargs:
+        from trajectory_generation import REFERENCE_CONTROL_POINTS, reference_trajectory
+        kwargs['left_points_ref'], kwargs['right_points_ref'] = reference_trajectory(REFERENCE_CONTROL_POINTS[scene])
+    return render_actors(show_episode(episode, func, scene, **kwargs), output, viewup='z')
+
+
+def render_episodes(store_path, out_dir, viewer='play_q_value_discrete_mix', scene='dualarm', episodes=None,
+                    ext=None, processes=None, **kwargs):
+    """
+    Render many episodes of a store offscreen, one episode per worker process.
+
+    Args:
+        store_path: directory of an EpisodeStore
+        out_dir: output directory, episode i is written to episode_%05d + ext
+        viewer: a key of VIEWERS
+        scene: dualarm or dualarmrod
+        episodes: episode indices, all of them by default
+        ext: '' for a directory of frames, '.mp4', '.gif', ... for videos and '.png' for the stills of show_*,
+            by default frames for the players and '.png' otherwise
+        processes: worker processes, os.cpu_count() by default, 0 renders in this process
+        kwargs: passed to the viewer, e.g. stride, num, batched
+
+    Returns:
+        list of the written outputs
+
+    """
+    if ext is None:
+        ext = '' if VIEWERS[viewer][1] == 'output' else '.png'
+    if episodes is None:
+        episodes = range(len(EpisodeStore(store_path)))
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = [osp.join(out_dir, 'episode_%05d%s' % (i, ext)) for i in episodes]
+
+    if processes == 0:
+        return [render_episode(store_path, i, viewer, output, scene, **kwargs) for i, output in zip(episodes, outputs)]
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(render_episode, store_path, i, viewer, output, scene, **kwargs)
+                   for i, output in zip(episodes, outputs)]
+        return [future.result() for future in futures]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store')
+    parser.add_argument('out_dir')
+    parser.add_argument('--viewer', default='play_q_value_discrete_mix', choices=sorted(VIEWERS))
+    parser.add_argument('--scene', default='dualarm')
+    parser.add_argument('--episodes', type=int, nargs='*')
+    parser.add_argument('--ext', default=None)
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    kwargs = dict(stride=args.stride) if VIEWERS[args.viewer][1] == 'output' else dict(batched=True)
+    for output in render_episodes(args.store, args.out_dir, args.viewer, args.scene, args.episodes,
+                                  args.ext, args.processes, **kwargs):
+        print(output)
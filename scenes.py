@@ -0,0 +1,59 @@
+"""Scenes -- 场景的静态几何和动作方向/颜色表"""
+from vedo import *
+
+# 离散动作: STOP FRONT BEHIND LEFT RIGHT UP DOWN
+COLOR_LIST = ['', 'red', 'blue', 'yellow', 'gray', 'brown', 'orange']
+VEC_LIST = np.array([[0., 0., 0.],
+                     [1., 0., 0.],
+                     [-1., 0., 0.],
+                     [0., -1., 0.],
+                     [0., 1., 0.],
+                     [0., 0., 1.],
+                     [0., 0., -1.]])
+VEC_LIST.flags.writeable = False
+
+# Static geometry of every scene, each shape is given by the two end centers of its axis and its radius.
+# target marks the insertion target, drawn but not an obstacle for clearance, render=False
+# shapes only exist for clearance, like the walls around the holes drawn by plot_env.
+# goal is the point of an obstacle where the paths end, contact within goal_tol (r by default)
+# of it is the insertion and not a collision.
+SCENES = {
+    'dualarmrod': [dict(pos=[(-0.005, -0.25, 1.055), (-0.005, -0.25, 1.4655)], r=0.0035, goal=(-0.005, -0.25, 1.4655)),
+                   dict(pos=[(0.005, 0.25, 1.055), (0.005, 0.25, 1.4655)], r=0.0035, goal=(0.005, 0.25, 1.4655))],
+    'dualarm': [dict(pos=[(0, -0.25, 1.055), (0, -0.25, 1.0655)], r=0.025, target=True),
+                dict(pos=[(0, 0.25, 1.055), (0, 0.25, 1.0655)], r=0.025, target=True),
+                dict(pos=[(0, -0.25, 1.0), (0, -0.25, 1.05)], r=0.075, r_inner=0.025, render=False),
+                dict(pos=[(0, 0.25, 1.0), (0, 0.25, 1.05)], r=0.075, r_inner=0.025, render=False)],
+}
+
+_environment_cache = {}
+
+
+def register_scene(name, cylinders):
+    """
+    Declare a new scene, or replace one, as a list of dict(pos=[end0, end1], r=radius).
+    kind='capsule', r_inner, goal, goal_tol, target and render are optional, see SCENES and clearance.
+    """
+    SCENES[name] = cylinders
+    _environment_cache.pop(name, None)
+
+
+def environment(scene):
+    """
+    Actors of the static geometry of a scene, built on the first call and reused afterwards.
+    An unknown scene has no geometry, like in the viewers before.
+
+    Returns:
+        a new list holding the cached actors
+
+    """
+    if scene not in _environment_cache:
+        actors = []
+        for shape in SCENES.get(scene, []):
+            if not shape.get('render', True):
+                continue
+            actors.append(Cylinder(pos=shape['pos'], r=shape['r'], axis=(0, 0, 1)))
+            if shape.get('kind') == 'capsule':
+                actors += [Sphere(end, r=shape['r']) for end in shape['pos']]
+        _environment_cache[scene] = actors
+    return list(_environment_cache[scene])
@@ -1,6 +1,11 @@
 """Local Q"""
 from vedo import *
 
+from glyphs import ArrowSlots, batched_arrows, lod_indices
+from instrument import instrumented, lap
+from player import render_player, run_player
+from scenes import COLOR_LIST, VEC_LIST, environment
+
 
 def plot_q_discrete(point, q_array):
     # 低于 Q 平均值的方向的箭头不画
@@ -28,7 +33,46 @@ def plot_q_discrete(point, q_array):
     return arrow
 
 
-def show_q_value_discrete(left_points, right_points, left_q, right_q, num, scene, left_act, right_act):
+def normalize_q(q_arrays):
+    """
+
+    Args:
+        q_arrays: (num, 7)
+
+    Returns:
+        (num, 7) arrow lengths, the same values plot_q_discrete draws for every row
+
+    """
+    q_arrays = np.asarray(q_arrays, dtype=float)
+    q = (q_arrays - q_arrays.mean(axis=1, keepdims=True)) / q_arrays.std(axis=1, keepdims=True) / 100
+    # 低于 Q 平均值的方向的箭头不画
+    q[:, 1:] = np.maximum(q[:, 1:], 0)
+    # 如果 STOP 的值最大，就不画箭头
+    q[np.argmax(q, axis=1) == 0] = 0
+    return q
+
+
+def plot_q_discrete_batched(points, q_arrays):
+    """
+    Vectorized plot_q_discrete over a whole episode.
+
+    Args:
+        points: (num, 3)
+        q_arrays: (num, 7) raw local Q
+
+    Returns:
+        6 Arrows meshes, one per direction class
+
+    """
+    points = np.asarray(points, dtype=float)
+    q = normalize_q(q_arrays)
+    arrow = [batched_arrows(points, points + q[:, [i]] * VEC_LIST[i], c=COLOR_LIST[i]) for i in range(1, 7)]
+    return arrow
+
+
+@instrumented
+def show_q_value_discrete(left_points, right_points, left_q, right_q, num, scene, left_act, right_act,
+                          batched=False, lod=None, screenshot=''):
     """
 
     Args:
@@ -40,16 +84,29 @@ def show_q_value_discrete(left_points, right_points, left_q, right_q, num, scene
         scene: dualarm or dualarmrod
         left_act: (num, 1)
         right_act: (num, 1)
+        batched: build one glyph mesh per direction class instead of one Arrow per step
+        lod: subsample the arrows, see glyphs.lod_indices, points and lines keep full resolution
+        screenshot: write an offscreen still image to this file instead of opening a window
 
     Returns:
 
     """
     settings.use_depth_peeling = True
 
+    left_idx = lod_indices(left_points[:num], left_act[:num], lod)
+    right_idx = lod_indices(right_points[:num], right_act[:num], lod)
+    lap('prep')
+
     arrows = []
-    for i in range(num):
-        arrows += plot_q_discrete(left_points[i], (left_q[i] - left_q[i].mean()) / left_q[i].std() / 100)
-        arrows += plot_q_discrete(right_points[i], (right_q[i] - right_q[i].mean()) / right_q[i].std() / 100)
+    if batched:
+        arrows += plot_q_discrete_batched(np.concatenate((left_points[left_idx], right_points[right_idx])),
+                                          np.concatenate((left_q[left_idx], right_q[right_idx])))
+    else:
+        for i in left_idx:
+            arrows += plot_q_discrete(left_points[i], (left_q[i] - left_q[i].mean()) / left_q[i].std() / 100)
+        for i in right_idx:
+            arrows += plot_q_discrete(right_points[i], (right_q[i] - right_q[i].mean()) / right_q[i].std() / 100)
+    lap('q arrows', arrows)
 
     pts_left = Points(list(map(tuple, left_points)), c='k')  # 黑色轨迹点--左
     pts_right = Points(list(map(tuple, right_points)), c='k')  # 黑色轨迹点--右
@@ -57,23 +114,12 @@ def show_q_value_discrete(left_points, right_points, left_q, right_q, num, scene
     spl_left.linecolor('green')
     spl_right = Line(pts_right)
     spl_right.linecolor('green')
+    lap('trajectory', pts_left, pts_right, spl_left, spl_right)
+
+    enviroment = environment(scene)
+    lap('environment', enviroment)
 
-    enviroment = []
-    if scene == "dualarmrod":
-        enviroment.append(Cylinder(pos=[(-0.005, -0.25, 1.055), (-0.005, -0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0.005, 0.25, 1.055), (0.005,  0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-    if scene == "dualarm":
-        enviroment.append(Cylinder(pos=[(0, -0.25, 1.055), (0, -0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0, 0.25, 1.055), (0,  0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
-
-    color_list = ['', 'red', 'blue', 'yellow', 'gray', 'brown', 'orange']
-    vec_list = [np.array([0., 0., 0.]),
-                np.array([1., 0., 0.]),
-                np.array([-1., 0., 0.]),
-                np.array([0., -1., 0.]),
-                np.array([0., 1., 0.]),
-                np.array([0., 0., 1.]),
-                np.array([0., 0., -1.])]
+    color_list, vec_list = COLOR_LIST, VEC_LIST
 
     # display action
     left_points_aux = left_points + np.array([0, 0.1, 0])
@@ -84,27 +130,111 @@ def show_q_value_discrete(left_points, right_points, left_q, right_q, num, scene
     spl_left_aux.linecolor('green')
     spl_right_aux = Line(right_points_aux)
     spl_right_aux.linecolor('green')
+    lap('action trajectory', pts_left_aux, pts_right_aux, spl_left_aux, spl_right_aux)
 
     arrows_aux = []
-    for i in range(num):
-        arrows_aux += [Arrow(left_points_aux[i],
-                             left_points_aux[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]),
-                       Arrow(right_points_aux[i],
-                             right_points_aux[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]])]
+    if batched:
+        starts = np.concatenate((left_points_aux[left_idx], right_points_aux[right_idx]))
+        acts = np.concatenate((np.asarray(left_act, dtype=int).ravel()[left_idx],
+                               np.asarray(right_act, dtype=int).ravel()[right_idx]))
+        arrows_aux.append(batched_arrows(starts, starts + np.asarray(vec_list)[acts]/100,
+                                         scalars=acts, color_list=color_list))
+    else:
+        for i in left_idx:
+            arrows_aux.append(Arrow(left_points_aux[i],
+                                    left_points_aux[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]))
+        for i in right_idx:
+            arrows_aux.append(Arrow(right_points_aux[i],
+                                    right_points_aux[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]]))
+    lap('action arrows', arrows_aux)
 
     # By specifying axes in show(), new axes are created which span the whole bounding box.
     # Options are passed through a dictionary
-    show(arrows,
-         pts_left,
-         pts_right,
-         spl_left,
-         spl_right,
-         enviroment,
-         pts_left_aux,
-         pts_right_aux,
-         spl_left_aux,
-         spl_right_aux,
-         arrows_aux,
-         __doc__,
-         viewup='z',
-         axes=dict(c='black', number_of_divisions=10, yzgrid=False),).close()
+    plt = show(arrows,
+               pts_left,
+               pts_right,
+               spl_left,
+               spl_right,
+               enviroment,
+               pts_left_aux,
+               pts_right_aux,
+               spl_left_aux,
+               spl_right_aux,
+               arrows_aux,
+               __doc__,
+               viewup='z',
+               axes=dict(c='black', number_of_divisions=10, yzgrid=False),
+               offscreen=bool(screenshot),
+               interactive=not screenshot,)
+    if screenshot:
+        plt.screenshot(screenshot)
+    plt.close()
+    lap('show')
+
+
+def play_q_value_discrete(left_points, right_points, left_q, right_q, num, scene, left_act, right_act,
+                          output=None, stride=1):
+    """
+    Step through the episode one timestep at a time, with a slider or the Left/Right keys.
+
+    The Q arrows and action arrows of both arms are two pre-allocated meshes
+    whose points are overwritten on every step, see glyphs.ArrowSlots.
+
+    Args:
+        left_points: (num, 3)
+        right_points: (num, 3)
+        left_q: (num, 7)
+        right_q: (num, 7)
+        num: points num
+        scene: dualarm or dualarmrod
+        left_act: (num, 1)
+        right_act: (num, 1)
+        output: render offscreen to this video file or frame directory instead, see player.render_player
+        stride: step between rendered timesteps with output
+
+    Returns:
+        the written files with output
+
+    """
+    settings.use_depth_peeling = True
+
+    left_points = np.asarray(left_points, dtype=float)[:num]
+    right_points = np.asarray(right_points, dtype=float)[:num]
+    left_act = np.asarray(left_act, dtype=int).ravel()[:num]
+    right_act = np.asarray(right_act, dtype=int).ravel()[:num]
+    q = normalize_q(np.concatenate((left_q[:num], right_q[:num])))
+
+    pts_left = Points(left_points, c='k')
+    pts_right = Points(right_points, c='k')
+    spl_left = Line(left_points)
+    spl_left.linecolor('green')
+    spl_right = Line(right_points)
+    spl_right.linecolor('green')
+    enviroment = environment(scene)
+
+    left_points_aux = left_points + np.array([0, 0.1, 0])
+    right_points_aux = right_points - np.array([0, 0.1, 0])
+    spl_left_aux = Line(left_points_aux)
+    spl_left_aux.linecolor('green')
+    spl_right_aux = Line(right_points_aux)
+    spl_right_aux.linecolor('green')
+
+    # 左右各 6 个 Q 箭头, 各 1 个动作箭头
+    directions = np.tile(np.arange(1, 7), 2)
+    q_arrows = ArrowSlots(12, VEC_LIST, COLOR_LIST, labels=directions)
+    act_arrows = ArrowSlots(2, VEC_LIST, COLOR_LIST)
+    text = Text2D('', pos='bottom-left', c='black')
+
+    def draw(i):
+        q_arrows.update(np.repeat([left_points[i], right_points[i]], 6, axis=0), directions,
+                        np.concatenate((q[i, 1:], q[num + i, 1:])))
+        acts = [left_act[i], right_act[i]]
+        act_arrows.update([left_points_aux[i], right_points_aux[i]], acts, 0.01, labels=acts)
+        text.text('step %d / %d' % (i, num - 1))
+
+    actors = [q_arrows.mesh, act_arrows.mesh, pts_left, pts_right, spl_left, spl_right, enviroment,
+              spl_left_aux, spl_right_aux, text]
+    show_kwargs = dict(viewup='z', axes=dict(c='black', number_of_divisions=10, yzgrid=False))
+    if output is not None:
+        return render_player(num, draw, actors, output, stride=stride, **show_kwargs)
+    run_player(num, draw, actors, **show_kwargs)
@@ -13,7 +13,14 @@ from vedo import *
 
 import numpy as np
 
+from glyphs import ArrowSlots, batched_arrows, lod_indices
+from instrument import instrumented, lap
+from player import render_player, run_player
+from q_analytics import greedy_joint
+from scenes import COLOR_LIST, VEC_LIST, environment
 
+
+@instrumented
 def q_matrix(
         data,
         pos,
@@ -110,6 +117,7 @@ def q_matrix(
 
     matr = np.flip(np.flip(data), axis=1).ravel(order="C")
     gr.cmap(cmap, matr, on="cells", vmin=vmin, vmax=vmax)
+    lap('grid', gr)
     sbar = None
     if scalarbar:
         gr.add_scalarbar3d(title_font=font, label_font=font)
@@ -125,6 +133,7 @@ def q_matrix(
             c=c,
         )
         labs.z(0.001)
+    lap('labels', sbar, labs)
     t = None
     if title:
         if title == "Matrix":
@@ -172,17 +181,178 @@ def q_matrix(
         if ylabs is not None:
             x0, x1 = ylabs[0].xbounds()
             yt.shift(-(x1 - x0) - 0.55 / (m + n), 0)
+    lap('text', t, xt, yt, xlabs, ylabs)
     asse = Assembly(gr, sbar, labs, t, xt, yt, xlabs, ylabs)
     asse.name = "Matrix"
     return asse
 
 
+@instrumented
+def q_matrix_batched(
+        data,
+        pos,
+        s=0.01,
+        cmap='Reds',
+        vmin=None,
+        vmax=None,
+        top_k=0,
+        value_precision=4,
+        font='Theemim',
+        scale=0.0015,
+        lc='white',
+        lw=1,
+        c='black',
+        alpha=1,):
+    """
+    Build the matrices of a whole episode as one mesh with one cell-scalar array.
+
+    Returns an ``Assembly`` of the grid mesh and, if ``top_k`` is not 0, one label mesh.
+
+    Parameters
+    ----------
+    data : numpy array
+        (num, n, m) matrices to visualize, float32 data keeps float32 cell scalars
+
+    pos : numpy array
+        (num, 3) centers of the matrices, or a list of such arrays (one per arm).
+        Every set of centers shares the same cell scalars
+
+    s : float
+        side length of one matrix
+
+    cmap : str
+        color map name
+
+    vmin : float
+        minimum value of the colormap range, if vmin and vmax are both None
+        every matrix is rescaled to its own range like ``q_matrix`` does
+
+    vmax : float
+        maximum value of the colormap range
+
+    top_k : int
+        number of largest cells labelled in every matrix, 0 for no labels and
+        None for all the cells
+
+    value_precision : int
+        number of digits for the labels
+
+    font : str
+        font name
+
+    scale : float
+        size of the labels
+
+    lc : str
+        color of the line separating the bins
+
+    lw : float
+        Width of the line separating the bins
+
+    c : str
+        text color
+
+    alpha : float
+        plot transparency
+    """
+    data = np.asarray(data)
+    # float32 保持 float32, float16 之类 VTK 不支持的类型升到 float32
+    data = data.astype(np.promote_types(data.dtype, np.float32), copy=False)
+    if data.ndim == 2:
+        data = data[None]
+    num, n, m = data.shape
+    origins = np.asarray(pos, dtype=float).reshape(-1, 3)
+    copies = len(origins) // num
+
+    # 单个矩阵的顶点和面, 第 0 行在最上面, 和 q_matrix 一致
+    gx, gy = np.meshgrid(np.linspace(-s / 2, s / 2, m + 1), np.linspace(s / 2, -s / 2, n + 1))
+    grid_verts = np.c_[gx.ravel(), gy.ravel(), np.zeros(gx.size)]
+    idx = np.arange(grid_verts.shape[0]).reshape(n + 1, m + 1)
+    grid_faces = np.stack([idx[:-1, :-1], idx[1:, :-1], idx[1:, 1:], idx[:-1, 1:]], axis=-1).reshape(-1, 4)
+    grid_centers = grid_verts[grid_faces].mean(axis=1)
+
+    verts = (origins[:, None, :] + grid_verts[None]).reshape(-1, 3)
+    faces = (grid_faces[None] + np.arange(len(origins))[:, None, None] * len(grid_verts)).reshape(-1, 4)
+
+    flat = data.reshape(num, -1)
+    if vmin is None and vmax is None:
+        lo = flat.min(axis=1, keepdims=True)
+        hi = flat.max(axis=1, keepdims=True)
+        values = (flat - lo) / np.where(hi > lo, hi - lo, 1)
+        vmin, vmax = 0, 1
+    else:
+        values = flat
+
+    gr = Mesh([verts, faces], c=c, alpha=alpha)
+    # 按名字 cmap, 直接传数组的话 vedo 会转成 float64
+    gr.celldata["Q"] = np.tile(values.ravel(), copies)
+    gr.cmap(cmap, "Q", on="cells", vmin=vmin, vmax=vmax)
+    gr.lc(lc).lw(lw)
+    lap('grid', gr)
+
+    labs = None
+    if top_k != 0:
+        k = n * m if top_k is None else min(top_k, n * m)
+        cells = np.argsort(-flat, axis=1)[:, :k]
+        label_values = np.take_along_axis(flat, cells, axis=1)
+        label_pts = origins.reshape(copies, num, 1, 3) + grid_centers[cells][None]
+        label_pts[..., 2] += 0.0001
+        pts = Points(label_pts.reshape(-1, 3))
+        pts.pointdata["Q"] = np.tile(label_values.ravel(), copies)
+        labs = pts.labels(
+            "Q",
+            scale=scale / max(m, n),
+            precision=value_precision,
+            font=font,
+            justify="center",
+            c=c,
+        )
+
+    lap('labels', labs)
+    asse = Assembly(gr, labs)
+    asse.name = "Matrices"
+    return asse
+
+
+class QMatrixSlots:
+    """
+    Pre-allocated q_matrix_batched mesh of `copies` matrices.
+
+    update() moves the matrices and rewrites their cell scalars in place,
+    so a player shows a new timestep without building new VTK objects.
+    """
+
+    def __init__(self, shape=(7, 7), copies=2, s=0.01, cmap='Reds', lc='white', lw=1, alpha=1):
+        self.mesh = q_matrix_batched(np.zeros((1,) + tuple(shape)), np.zeros((copies, 3)), s=s, cmap=cmap,
+                                     lc=lc, lw=lw, alpha=alpha).unpack()[0]
+        self.copies = copies
+        self.vertices = self.mesh.vertices.reshape(copies, -1, 3)
+        self.templates = self.vertices.astype(float)
+        self.values = self.mesh.celldata["Q"]
+
+    def update(self, pos, data):
+        """
+        Args:
+            pos: (copies, 3) centers of the matrices
+            data: (n, m) matrix shown by every copy, rescaled to its own range like q_matrix
+        """
+        self.vertices[:] = self.templates + np.asarray(pos, dtype=float)[:, None]
+        flat = np.asarray(data, dtype=float).ravel()
+        lo, hi = flat.min(), flat.max()
+        self.values[:] = np.tile((flat - lo) / (hi - lo if hi > lo else 1), self.copies)
+        self.mesh.dataset.GetPoints().Modified()
+        self.mesh.dataset.GetCellData().GetArray("Q").Modified()
+        self.mesh.dataset.Modified()
+
+
 def plot_q_discrete(point, q_array):
     mat = q_matrix(q_array, tuple(point))
     return mat
 
 
-def show_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, left_act, right_act):
+@instrumented
+def show_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, left_act, right_act,
+                              batched=False, top_k=0, lod=None, screenshot=''):
     """
 
     Args:
@@ -193,16 +363,29 @@ def show_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, l
         scene: dualarm or dualarmrod
         left_act: (num, 1)
         right_act: (num, 1)
+        batched: build all the matrices of both arms as one mesh, and the arrows as glyphs, instead of actors per step
+        top_k: labelled cells per matrix in batched mode, 0 for none and None for all
+        lod: subsample the matrices and arrows, see glyphs.lod_indices, points and lines keep full resolution
+        screenshot: write an offscreen still image to this file instead of opening a window
 
     Returns:
 
     """
     settings.use_depth_peeling = True
 
+    # joint Q 两臂共用, 所以两臂用同一组下标
+    idx = lod_indices(left_points[:num], np.c_[np.ravel(left_act)[:num], np.ravel(right_act)[:num]], lod)
+    lap('prep')
+
     cm = []
-    for i in range(num):
-        cm.append(plot_q_discrete(left_points[i], q_arrays[i, :, :]))
-        cm.append(plot_q_discrete(right_points[i], q_arrays[i, :, :]))
+    if batched:
+        # 左右两臂共用同一组 cell scalars
+        cm.append(q_matrix_batched(q_arrays[idx], [left_points[idx], right_points[idx]], top_k=top_k))
+    else:
+        for i in idx:
+            cm.append(plot_q_discrete(left_points[i], q_arrays[i, :, :]))
+            cm.append(plot_q_discrete(right_points[i], q_arrays[i, :, :]))
+    lap('matrices', cm)
 
     pts_left = Points(list(map(tuple, left_points)), c='k')
     pts_right = Points(list(map(tuple, right_points)), c='k')
@@ -210,32 +393,29 @@ def show_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, l
     spl_left.linecolor('green')
     spl_right = Line(right_points)
     spl_right.linecolor('green')
+    lap('trajectory', pts_left, pts_right, spl_left, spl_right)
 
-    enviroment = []
-    if scene == "dualarmrod":
-        enviroment.append(Cylinder(pos=[(-0.005, -0.25, 1.055), (-0.005, -0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0.005, 0.25, 1.055), (0.005,  0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-    if scene == "dualarm":
-        enviroment.append(Cylinder(pos=[(0, -0.25, 1.055), (0, -0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0, 0.25, 1.055), (0,  0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
+    enviroment = environment(scene)
+    lap('environment', enviroment)
 
     # 选择 Q 最大的 joint action
-    color_list = ['', 'red', 'blue', 'yellow', 'gray', 'brown', 'orange']
-    vec_list = [np.array([0., 0., 0.]),
-                np.array([1., 0., 0.]),
-                np.array([-1., 0., 0.]),
-                np.array([0., -1., 0.]),
-                np.array([0., 1., 0.]),
-                np.array([0., 0., 1.]),
-                np.array([0., 0., -1.])]
+    color_list, vec_list = COLOR_LIST, VEC_LIST
 
     arrows = []
-    for i in range(num):
-        cm_data = q_arrays[i]
-        # 获得最大值的下标
-        left_index, right_index = np.unravel_index(np.argmax(cm_data, axis=None), cm_data.shape)
-        arrows += [Arrow(left_points[i], left_points[i]+vec_list[left_index]/100, c=color_list[left_index]),
-                   Arrow(right_points[i], right_points[i]+vec_list[right_index]/100, c=color_list[right_index])]
+    if batched:
+        left_index, right_index, _ = greedy_joint(q_arrays[idx])
+        starts = np.concatenate((left_points[idx], right_points[idx]))
+        acts = np.concatenate((left_index, right_index))
+        arrows.append(batched_arrows(starts, starts + np.asarray(vec_list)[acts]/100,
+                                     scalars=acts, color_list=color_list))
+    else:
+        for i in idx:
+            cm_data = q_arrays[i]
+            # 获得最大值的下标
+            left_index, right_index = np.unravel_index(np.argmax(cm_data, axis=None), cm_data.shape)
+            arrows += [Arrow(left_points[i], left_points[i]+vec_list[left_index]/100, c=color_list[left_index]),
+                       Arrow(right_points[i], right_points[i]+vec_list[right_index]/100, c=color_list[right_index])]
+    lap('greedy arrows', arrows)
 
     # display action
     left_points_aux = left_points + np.array([0, 0.1, 0])
@@ -246,28 +426,227 @@ def show_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, l
     spl_left_aux.linecolor('green')
     spl_right_aux = Line(right_points_aux)
     spl_right_aux.linecolor('green')
+    lap('action trajectory', pts_left_aux, pts_right_aux, spl_left_aux, spl_right_aux)
 
     arrows_aux = []
-    for i in range(num):
-        arrows_aux += [Arrow(left_points_aux[i],
-                             left_points_aux[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]),
-                       Arrow(right_points_aux[i],
-                             right_points_aux[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]])]
+    if batched:
+        starts = np.concatenate((left_points_aux[idx], right_points_aux[idx]))
+        acts = np.concatenate((np.asarray(left_act, dtype=int).ravel()[idx],
+                               np.asarray(right_act, dtype=int).ravel()[idx]))
+        arrows_aux.append(batched_arrows(starts, starts + np.asarray(vec_list)[acts]/100,
+                                         scalars=acts, color_list=color_list))
+    else:
+        for i in idx:
+            arrows_aux += [Arrow(left_points_aux[i],
+                                 left_points_aux[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]),
+                           Arrow(right_points_aux[i],
+                                 right_points_aux[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]])]
+    lap('action arrows', arrows_aux)
 
     # By specifying axes in show(), new axes are created which span the whole bounding box.
     # Options are passed through a dictionary
-    show(cm,
-         pts_left,
-         pts_right,
-         spl_left,
-         spl_right,
-         enviroment,
-         arrows,
-         pts_left_aux,
-         pts_right_aux,
-         spl_left_aux,
-         spl_right_aux,
-         arrows_aux,
-         __doc__,
-         viewup='z',
-         axes=dict(c='black', number_of_divisions=10, yzgrid=False),).close()
+    plt = show(cm,
+               pts_left,
+               pts_right,
+               spl_left,
+               spl_right,
+               enviroment,
+               arrows,
+               pts_left_aux,
+               pts_right_aux,
+               spl_left_aux,
+               spl_right_aux,
+               arrows_aux,
+               __doc__,
+               viewup='z',
+               axes=dict(c='black', number_of_divisions=10, yzgrid=False),
+               offscreen=bool(screenshot),
+               interactive=not screenshot,)
+    if screenshot:
+        plt.screenshot(screenshot)
+    plt.close()
+    lap('show')
+
+
+def iter_chunks(left_points, right_points, q_arrays, left_act, right_act, chunk=4096, num=None):
+    """
+    Cut arrays, or memmaps of an EpisodeStore, into the (points, q_matrix, action) chunks
+    read by show_q_value_discrete_mix_stream, only one chunk is read at a time.
+
+    Yields:
+        points: (k, 2, 3) left and right points
+        q_matrix: (k, 7, 7)
+        action: (k, 2) left and right actions
+
+    """
+    num = len(q_arrays) if num is None else min(num, len(q_arrays))
+    for b in range(0, num, chunk):
+        e = min(b + chunk, num)
+        yield (np.stack((left_points[b:e], right_points[b:e]), axis=1),
+               np.asarray(q_arrays[b:e]),
+               np.c_[np.ravel(left_act[b:e]), np.ravel(right_act[b:e])])
+
+
+@instrumented
+def show_q_value_discrete_mix_stream(chunks, scene, block=4096, q_dtype=np.float32, top_k=0, lod=None,
+                                     screenshot=''):
+    """
+    Streaming variant of show_q_value_discrete_mix(batched=True) for episodes too long to hold at once.
+
+    The chunks are copied into one pre-allocated block of `block` steps, every
+    full block becomes one matrix mesh and two arrow meshes, so the memory
+    besides the final geometry stays bounded by the block size whatever the
+    length of the episode or the size of the chunks.
+
+    Args:
+        chunks: iterable of (points, q_matrix, action) chunks, see iter_chunks
+            points: (k, 2, 3) left and right points
+            q_matrix: (k, 7, 7)
+            action: (k, 2) left and right actions
+        scene: dualarm or dualarmrod
+        block: steps per block
+        q_dtype: dtype of Q in the block, float16 or float32 save memory, both give float32 cell scalars
+        top_k: labelled cells per matrix, 0 for none and None for all
+        lod: subsample the matrices and arrows of every block, see glyphs.lod_indices
+        screenshot: write an offscreen still image to this file instead of opening a window
+
+    Returns:
+
+    """
+    settings.use_depth_peeling = True
+    color_list, vec_list = COLOR_LIST, VEC_LIST
+    aux = np.array([[0, 0.1, 0], [0, -0.1, 0]])
+
+    points = acts = q_block = None
+    filled = 0
+    cm, arrows, arrows_aux, traces = [], [], [], []
+
+    def flush():
+        pts, q, act = points[:filled], q_block[:filled], acts[:filled]
+        idx = lod_indices(pts[:, 0], act, lod)
+        cm.append(q_matrix_batched(q[idx], [pts[idx, 0], pts[idx, 1]], top_k=top_k))
+        left_index, right_index, _ = greedy_joint(q[idx])
+        for starts, dirs, target in (((pts[idx, 0], pts[idx, 1]), (left_index, right_index), arrows),
+                                     ((pts[idx, 0] + aux[0], pts[idx, 1] + aux[1]), act[idx].T, arrows_aux)):
+            starts = np.concatenate(starts)
+            dirs = np.concatenate(dirs)
+            target.append(batched_arrows(starts, starts + vec_list[dirs] / 100, scalars=dirs, color_list=color_list))
+        # 只保留 float32 的点, 最后画点和线
+        traces.append(pts.astype(np.float32))
+        lap('block', cm[-1], arrows[-1], arrows_aux[-1])
+
+    for chunk_points, chunk_q, chunk_act in chunks:
+        chunk_points = np.asarray(chunk_points).reshape(-1, 2, 3)
+        chunk_act = np.asarray(chunk_act).reshape(-1, 2)
+        if q_block is None:
+            points = np.empty((block, 2, 3))
+            acts = np.empty((block, 2), dtype=int)
+            q_block = np.empty((block,) + np.shape(chunk_q)[1:], dtype=q_dtype)
+        start = 0
+        while start < len(chunk_points):
+            k = min(block - filled, len(chunk_points) - start)
+            points[filled:filled + k] = chunk_points[start:start + k]
+            acts[filled:filled + k] = chunk_act[start:start + k]
+            q_block[filled:filled + k] = chunk_q[start:start + k]
+            filled += k
+            start += k
+            if filled == block:
+                flush()
+                filled = 0
+    if filled:
+        flush()
+
+    trace = np.concatenate(traces) if traces else np.zeros((0, 2, 3), dtype=np.float32)
+    lines = []
+    # 什么都没有读到时没有轨迹, Line 至少要两个点
+    for arm in range(2 if len(trace) else 0):
+        for offset in (0, aux[arm]):
+            arm_points = trace[:, arm] + offset
+            line = Line(arm_points)
+            line.linecolor('green')
+            lines += [Points(arm_points, c='k'), line]
+    lap('trajectory', lines)
+
+    plt = show(cm,
+               lines,
+               environment(scene),
+               arrows,
+               arrows_aux,
+               __doc__,
+               viewup='z',
+               axes=dict(c='black', number_of_divisions=10, yzgrid=False),
+               offscreen=bool(screenshot),
+               interactive=not screenshot,)
+    if screenshot:
+        plt.screenshot(screenshot)
+    plt.close()
+    lap('show')
+
+
+def play_q_value_discrete_mix(left_points, right_points, q_arrays, num, scene, left_act, right_act,
+                              output=None, stride=1):
+    """
+    Step through the episode one timestep at a time, with a slider or the Left/Right keys.
+
+    The Q matrices of both arms and the arrows are pre-allocated once and
+    updated in place on every step, see QMatrixSlots and glyphs.ArrowSlots.
+
+    Args:
+        left_points: (num, 3)
+        right_points: (num, 3)
+        q_arrays: (num, 7, 7)
+        num: points num
+        scene: dualarm or dualarmrod
+        left_act: (num, 1)
+        right_act: (num, 1)
+        output: render offscreen to this video file or frame directory instead, see player.render_player
+        stride: step between rendered timesteps with output
+
+    Returns:
+        the written files with output
+
+    """
+    settings.use_depth_peeling = True
+
+    left_points = np.asarray(left_points, dtype=float)[:num]
+    right_points = np.asarray(right_points, dtype=float)[:num]
+    left_act = np.asarray(left_act, dtype=int).ravel()[:num]
+    right_act = np.asarray(right_act, dtype=int).ravel()[:num]
+    q_arrays = q_arrays[:num]
+    # 选择 Q 最大的 joint action
+    left_index, right_index, _ = greedy_joint(q_arrays)
+
+    pts_left = Points(left_points, c='k')
+    pts_right = Points(right_points, c='k')
+    spl_left = Line(left_points)
+    spl_left.linecolor('green')
+    spl_right = Line(right_points)
+    spl_right.linecolor('green')
+    enviroment = environment(scene)
+
+    left_points_aux = left_points + np.array([0, 0.1, 0])
+    right_points_aux = right_points - np.array([0, 0.1, 0])
+    spl_left_aux = Line(left_points_aux)
+    spl_left_aux.linecolor('green')
+    spl_right_aux = Line(right_points_aux)
+    spl_right_aux.linecolor('green')
+
+    cm = QMatrixSlots(q_arrays.shape[1:])
+    arrows = ArrowSlots(2, VEC_LIST, COLOR_LIST)
+    arrows_aux = ArrowSlots(2, VEC_LIST, COLOR_LIST)
+    text = Text2D('', pos='bottom-left', c='black')
+
+    def draw(i):
+        cm.update([left_points[i], right_points[i]], q_arrays[i])
+        greedy = [left_index[i], right_index[i]]
+        arrows.update([left_points[i], right_points[i]], greedy, 0.01, labels=greedy)
+        acts = [left_act[i], right_act[i]]
+        arrows_aux.update([left_points_aux[i], right_points_aux[i]], acts, 0.01, labels=acts)
+        text.text('step %d / %d   max Q %.4f' % (i, num - 1, np.max(q_arrays[i])))
+
+    actors = [cm.mesh, arrows.mesh, arrows_aux.mesh, pts_left, pts_right, spl_left, spl_right, enviroment,
+              spl_left_aux, spl_right_aux, text, __doc__]
+    show_kwargs = dict(viewup='z', axes=dict(c='black', number_of_divisions=10, yzgrid=False))
+    if output is not None:
+        return render_player(num, draw, actors, output, stride=stride, **show_kwargs)
+    run_player(num, draw, actors, **show_kwargs)
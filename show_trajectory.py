@@ -1,7 +1,13 @@
 from vedo import *
 
+from glyphs import batched_arrows, lod_indices, vector_field
+from instrument import instrumented, lap
+from scenes import COLOR_LIST, VEC_LIST, environment
 
-def show_trajectory_discrete(left_points_ref, right_points_ref, left_points, right_points, num, scene, left_act, right_act):
+
+@instrumented
+def show_trajectory_discrete(left_points_ref, right_points_ref, left_points, right_points, num, scene, left_act, right_act,
+                             batched=False, lod=None):
     """
 
     Args:
@@ -13,6 +19,8 @@ def show_trajectory_discrete(left_points_ref, right_points_ref, left_points, rig
         scene: dualarm or dualarmrod
         left_act: (num, 1)
         right_act: (num, 1)
+        batched: draw all arrows as one merged glyph mesh instead of one Arrow per step
+        lod: subsample the arrows, see glyphs.lod_indices, points and lines keep full resolution
 
     Returns:
 
@@ -26,25 +34,14 @@ def show_trajectory_discrete(left_points_ref, right_points_ref, left_points, rig
     spl_left_ref.linecolor('green')
     spl_right_ref = Line(pts_right_ref)
     spl_right_ref.linecolor('green')
+    lap('reference', pts_left_ref, pts_right_ref, spl_left_ref, spl_right_ref)
 
     # display enviroment
-    enviroment = []
-    if scene == "dualarmrod":
-        enviroment.append(Cylinder(pos=[(-0.005, -0.25, 1.055), (-0.005, -0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0.005, 0.25, 1.055), (0.005,  0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-    if scene == "dualarm":
-        enviroment.append(Cylinder(pos=[(0, -0.25, 1.055), (0, -0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0, 0.25, 1.055), (0,  0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
+    enviroment = environment(scene)
+    lap('environment', enviroment)
 
     # display trajectory and action
-    color_list = ['', 'red', 'blue', 'yellow', 'gray', 'brown', 'orange']
-    vec_list = [np.array([0., 0., 0.]),
-                np.array([1., 0., 0.]),
-                np.array([-1., 0., 0.]),
-                np.array([0., -1., 0.]),
-                np.array([0., 1., 0.]),
-                np.array([0., 0., 1.]),
-                np.array([0., 0., -1.])]
+    color_list, vec_list = COLOR_LIST, VEC_LIST
 
     pts_left = Points(list(map(tuple, left_points)), c='k')
     pts_right = Points(list(map(tuple, right_points)), c='k')
@@ -52,20 +49,36 @@ def show_trajectory_discrete(left_points_ref, right_points_ref, left_points, rig
     spl_left.linecolor('black')
     spl_right = Line(right_points)
     spl_right.linecolor('black')
+    lap('trajectory', pts_left, pts_right, spl_left, spl_right)
+
+    left_idx = lod_indices(left_points[:num], left_act[:num], lod)
+    right_idx = lod_indices(right_points[:num], right_act[:num], lod)
 
     arrows = []
-    for i in range(num):
-        arrows += [Arrow(left_points[i],
-                             left_points[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]),
-                       Arrow(right_points[i],
-                             right_points[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]])]
+    if batched:
+        # 所有箭头合并为一个 mesh, 颜色由 action 决定
+        starts = np.concatenate((left_points[left_idx], right_points[right_idx]))
+        acts = np.concatenate((np.asarray(left_act, dtype=int).ravel()[left_idx],
+                               np.asarray(right_act, dtype=int).ravel()[right_idx]))
+        arrows.append(batched_arrows(starts, starts + np.asarray(vec_list)[acts]/100,
+                                     scalars=acts, color_list=color_list))
+    else:
+        for i in left_idx:
+            arrows.append(Arrow(left_points[i], left_points[i]+vec_list[left_act[i]]/100, c=color_list[left_act[i]]))
+        for i in right_idx:
+            arrows.append(Arrow(right_points[i], right_points[i]+vec_list[right_act[i]]/100, c=color_list[right_act[i]]))
+
+    lap('arrows', arrows)
 
     # By specifying axes in show(), new axes are created which span the whole bounding box.
     # Options are passed through a dictionary
     return spl_left_ref, spl_right_ref, enviroment, pts_left, pts_right, spl_left, spl_right, arrows
 
 
-def show_trajectory_continuous(left_points_ref, right_points_ref, left_points, right_points, num, scene, left_act, right_act):
+@instrumented
+def show_trajectory_continuous(left_points_ref, right_points_ref, left_points, right_points, num, scene, left_act, right_act,
+                               batched=False, lod=None, field=False, scale=0.01, threshold=None, cmap='viridis',
+                               normalize=False):
     """
 
     Args:
@@ -77,6 +90,13 @@ def show_trajectory_continuous(left_points_ref, right_points_ref, left_points, r
         scene: dualarm or dualarmrod
         left_act: (num, 3)
         right_act: (num, 3)
+        batched: draw all arrows as one merged glyph mesh instead of one Arrow per step
+        lod: subsample the arrows, see glyphs.lod_indices, points and lines keep full resolution
+        field: draw the actions of both arms as one vector field coloured by magnitude, see glyphs.vector_field
+        scale: arrow length per unit of action, 1/100 like the orange arrows
+        threshold: with field, hide the actions of smaller magnitude
+        cmap: with field, color map of the magnitude
+        normalize: with field, same length for every arrow
 
     Returns:
 
@@ -90,15 +110,11 @@ def show_trajectory_continuous(left_points_ref, right_points_ref, left_points, r
     spl_left_ref.linecolor('green')
     spl_right_ref = Line(pts_right_ref)
     spl_right_ref.linecolor('green')
+    lap('reference', pts_left_ref, pts_right_ref, spl_left_ref, spl_right_ref)
 
     # display enviroment
-    enviroment = []
-    if scene == "dualarmrod":
-        enviroment.append(Cylinder(pos=[(-0.005, -0.25, 1.055), (-0.005, -0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0.005, 0.25, 1.055), (0.005,  0.25, 1.4655)], r=0.0035, axis=(0, 0, 1)))
-    if scene == "dualarm":
-        enviroment.append(Cylinder(pos=[(0, -0.25, 1.055), (0, -0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
-        enviroment.append(Cylinder(pos=[(0, 0.25, 1.055), (0,  0.25, 1.0655)], r=0.025, axis=(0, 0, 1)))
+    enviroment = environment(scene)
+    lap('environment', enviroment)
 
     # display trajectory and action
     pts_left = Points(list(map(tuple, left_points)), c='k')
@@ -107,10 +123,28 @@ def show_trajectory_continuous(left_points_ref, right_points_ref, left_points, r
     spl_left.linecolor('black')
     spl_right = Line(right_points)
     spl_right.linecolor('black')
+    lap('trajectory', pts_left, pts_right, spl_left, spl_right)
+
+    left_idx = lod_indices(left_points[:num], left_act[:num], lod)
+    right_idx = lod_indices(right_points[:num], right_act[:num], lod)
 
     arrows = []
-    for i in range(num):
-        arrows += [Arrow(left_points[i], left_points[i]+left_act[i]/100, c="orange"), Arrow(right_points[i], right_points[i]+right_act[i]/100, c="orange")]
+    if field or batched:
+        starts = np.concatenate((left_points[left_idx], right_points[right_idx]))
+        acts = np.concatenate((np.asarray(left_act)[left_idx], np.asarray(right_act)[right_idx]))
+    if field:
+        # 颜色表示 action 大小, 两臂共用一个颜色范围
+        glyphs = vector_field(starts, acts, scale=scale, cmap=cmap, threshold=threshold, normalize=normalize)
+        arrows += [] if glyphs is None else [glyphs]
+    elif batched:
+        arrows.append(batched_arrows(starts, starts + acts*scale, c="orange"))
+    else:
+        for i in left_idx:
+            arrows.append(Arrow(left_points[i], left_points[i]+left_act[i]*scale, c="orange"))
+        for i in right_idx:
+            arrows.append(Arrow(right_points[i], right_points[i]+right_act[i]*scale, c="orange"))
+
+    lap('arrows', arrows)
 
     # By specifying axes in show(), new axes are created which span the whole bounding box.
     # Options are passed through a dictionary
@@ -0,0 +1,130 @@
+"""Tracking error -- 执行轨迹和参考轨迹的距离"""
+import numpy as np
+
+# Upper bound of the (episodes, steps, segments) elements computed at once
+CHUNK_ELEMENTS = 4000000
+
+
+def nearest_on_polyline(points, ref):
+    """
+    Nearest point of a reference polyline for every step of a batch of rollouts.
+
+    Every step is projected on every segment of the reference, episodes are
+    processed in chunks so the (episodes, steps, segments) arrays stay bounded.
+
+    Args:
+        points: (B, N, 3) or (N, 3) executed trajectories, NaN rows for padding
+        ref: (M, 3) shared reference or (B, M, 3) one per episode
+
+    Returns:
+        distance: (B, N) or (N,) distance to the reference
+        progress: (B, N) or (N,) arc length along the reference of the nearest point
+        segment: (B, N) or (N,) index of the nearest segment
+
+    """
+    points = np.asarray(points, dtype=float)
+    ref = np.asarray(ref, dtype=float)
+    single = points.ndim == 2
+    if single:
+        points = points[None]
+    if ref.ndim == 2:
+        ref = ref[None]
+    num, n = points.shape[:2]
+
+    # 平移到参考轨迹中心附近, 展开平方时减少抵消误差
+    center = np.nanmean(ref.reshape(-1, 3), axis=0)
+    points = points - center
+    ref = ref - center
+    start = ref[:, :-1]
+    seg = ref[:, 1:] - start
+    seg_len2 = np.maximum(np.sum(seg ** 2, axis=-1), 1e-300)
+    lengths = np.concatenate((np.zeros((len(ref), 1)), np.cumsum(np.sqrt(seg_len2), axis=-1)), axis=-1)
+    start_seg = np.sum(start * seg, axis=-1)
+    start_len2 = np.sum(start ** 2, axis=-1)
+
+    distance = np.empty((num, n))
+    progress = np.empty((num, n))
+    segment = np.zeros((num, n), dtype=int)
+    chunk = max(1, CHUNK_ELEMENTS // max(1, n * seg.shape[1]))
+    for b in range(0, num, chunk):
+        e = min(b + chunk, num)
+        r = slice(b, e) if len(ref) > 1 else slice(0, 1)
+        p = points[b:e]
+        # |p - a - t d|^2 展开成矩阵乘法, 不生成 (b, n, S, 3) 的数组
+        w = np.matmul(p, seg[r].transpose(0, 2, 1)) - start_seg[r, None]
+        t = np.clip(w / seg_len2[r, None], 0, 1)
+        dist2 = (np.sum(p ** 2, axis=-1)[..., None] - 2 * np.matmul(p, start[r].transpose(0, 2, 1))
+                 + start_len2[r, None] - 2 * t * w + t ** 2 * seg_len2[r, None])
+        best = np.argmin(np.where(np.isnan(dist2), np.inf, dist2), axis=-1)
+        rows = np.arange(e - b)[:, None] if len(ref) > 1 else np.zeros((e - b, 1), dtype=int)
+        best_t = np.take_along_axis(t, best[..., None], axis=-1)[..., 0]
+        distance[b:e] = np.sqrt(np.maximum(np.take_along_axis(dist2, best[..., None], axis=-1)[..., 0], 0))
+        progress[b:e] = lengths[rows, best] + best_t * np.sqrt(seg_len2[rows, best])
+        segment[b:e] = best
+
+    if single:
+        return distance[0], progress[0], segment[0]
+    return distance, progress, segment
+
+
+def tracking_error(points, ref):
+    """
+    Per-step and per-episode tracking error of a batch of rollouts.
+
+    Args:
+        points: (B, N, 3) or (N, 3) executed trajectories, NaN rows pad shorter episodes
+        ref: (M, 3) or (B, M, 3) reference trajectories
+
+    Returns:
+        dict of NumPy arrays
+            distance: (B, N) nearest distance of every step
+            progress: (B, N) fraction of the reference length reached by every step
+            rmse: (B,) root mean square of distance
+            max: (B,) largest distance
+            final_progress: (B,) progress of the last valid step
+
+    """
+    points = np.asarray(points, dtype=float)
+    ref = np.asarray(ref, dtype=float)
+    if points.ndim == 2:
+        points = points[None]
+    distance, progress, _ = nearest_on_polyline(points, ref)
+    total = np.sum(np.linalg.norm(np.diff(ref, axis=-2), axis=-1), axis=-1)
+    progress = progress / np.reshape(np.where(total > 0, total, 1), (-1, 1))
+
+    valid = ~np.isnan(points).any(axis=-1)
+    distance = np.where(valid, distance, np.nan)
+    progress = np.where(valid, progress, np.nan)
+    last = np.maximum(valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1), 0)
+    return dict(distance=distance,
+                progress=progress,
+                rmse=np.sqrt(np.nanmean(distance ** 2, axis=1)),
+                max=np.nanmax(distance, axis=1),
+                final_progress=progress[np.arange(len(progress)), last])
+
+
+def dual_arm_tracking_error(left_points, right_points, left_points_ref, right_points_ref):
+    """
+    tracking_error of both arms, with the episode rmse of the two arms combined.
+
+    Args:
+        left_points: (B, N, 3)
+        right_points: (B, N, 3)
+        left_points_ref: (M, 3) or (B, M, 3)
+        right_points_ref: (M, 3) or (B, M, 3)
+
+    Returns:
+        left, right, rmse -- two tracking_error dicts and (B,) rmse over both arms
+
+    """
+    left = tracking_error(left_points, left_points_ref)
+    right = tracking_error(right_points, right_points_ref)
+    rmse = np.sqrt((left['rmse'] ** 2 + right['rmse'] ** 2) / 2)
+    return left, right, rmse
+
+
+def rank_episodes(rmse):
+    """
+    Episode indices from the best to the worst tracking.
+    """
+    return np.argsort(rmse, kind='stable')
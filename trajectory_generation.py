@@ -1,28 +1,247 @@
 import matplotlib as mpl
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+from matplotlib.collections import LineCollection
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
+from functools import lru_cache
+from math import comb
 
 
-def plot_env(axes):
-    # left hole
-    cx, cy, cz = get_cyn_by_axes(offset=[0, -0.25, 0], division=40, main_axis='z', height_end=1.05,
-                                 height_start=1, radius=0.025)
-    axes.plot_surface(cx, cy, cz, rstride=1, cstride=1, linewidth=0, alpha=0.25, shade=False, color='b')
+# 两臂参考轨迹的控制点 P0 P1 P2 P3, 第一行左臂, 第二行右臂
+REFERENCE_CONTROL_POINTS = {
+    # 插孔: 终点在孔口上方
+    'dualarm': np.array([[[-0.2, -0.25, 1.045], [0., -0.25, 1.15], [0., -0.25, 1.1], [0., -0.25, 1.0575]],
+                         [[-0.2, 0.25, 1.045], [0., 0.25, 1.15], [0., 0.25, 1.1], [0., 0.25, 1.0575]]]),
+    # 套杆: 终点在杆顶
+    'dualarmrod': np.array([[[-0.2, -0.25, 1.055], [-0.105, -0.25, 1.6], [-0.005, -0.25, 1.485],
+                             [-0.005, -0.25, 1.4655]],
+                            [[-0.2, 0.25, 1.055], [-0.095, 0.25, 1.6], [0.005, 0.25, 1.485],
+                             [0.005, 0.25, 1.4655]]]),
+}
 
-    cx, cy, cz = get_cyn_by_axes(offset=[0, -0.25, 0], division=40, main_axis='z', height_end=1.05,
-                                 height_start=1, radius=0.075)
-    axes.plot_surface(cx, cy, cz, rstride=1, cstride=1, linewidth=0, alpha=0.25, color='b')
 
-    # right hole
-    cx, cy, cz = get_cyn_by_axes(offset=[0, 0.25, 0], division=40, main_axis='z', height_end=1.05,
-                                 height_start=1, radius=0.025)
-    axes.plot_surface(cx, cy, cz, rstride=1, cstride=1, linewidth=0, alpha=0.25, shade=False, color='b')
-    
-    cx, cy, cz = get_cyn_by_axes(offset=[0, 0.25, 0], division=40, main_axis='z', height_end=1.05,
-                                 height_start=1, radius=0.075)
-    axes.plot_surface(cx, cy, cz, rstride=1, cstride=1, linewidth=0, alpha=0.25, color='b')
+def bernstein_matrix(t, order):
+    """
+    Bernstein basis of a Bezier curve of the given order.
+
+    Input
+      t: (N,) curve parameters in [0, 1]
+      order: 1 for a line, 2 for quadratic, 3 for cubic, ...
+    Output
+      (N, order+1) matrix, row n holds the weights of the control points at t[n]
+    """
+    t = np.asarray(t, dtype=float)[:, None]
+    k = np.arange(order + 1)
+    coef = np.array([comb(order, i) for i in k], dtype=float)
+    return coef * t ** k * (1 - t) ** (order - k)
+
+
+def bezier(control_points, t):
+    """
+    Evaluate a batch of Bezier curves of any order at the parameters t.
+
+    Input
+      control_points: (B, K, 3) or (K, 3), K-1 is the order of the curve
+      t: (N,) curve parameters, or an int N for N uniform samples in [0, 1]
+    Output
+      (B, N, 3), or (N, 3) for a single curve
+    """
+    control_points = np.asarray(control_points, dtype=float)
+    if np.isscalar(t):
+        t = np.linspace(0, 1, t)
+    basis = bernstein_matrix(t, control_points.shape[-2] - 1)
+    return np.matmul(basis, control_points)
+
+
+def line(start, end, t):
+    """
+    Straight segments from start to end, (B, 3) or (3,) each, see bezier.
+    """
+    return bezier(np.stack((start, end), axis=-2), t)
+
+
+def reference_trajectory(control_points, n_bezier=85, n_line=15):
+    """
+    Quadratic Bezier through P0, P1, P2 followed by a line from P2 to P3,
+    the shape of the reference trajectories of both arms.
+
+    Input
+      control_points: (B, 4, 3) or (4, 3) rows P0, P1, P2, P3
+      n_bezier, n_line: samples of the two parts
+    Output
+      (B, n_bezier+n_line, 3), or (n_bezier+n_line, 3) for a single trajectory
+    """
+    control_points = np.asarray(control_points, dtype=float)
+    return np.concatenate((bezier(control_points[..., :3, :], n_bezier),
+                           line(control_points[..., 2, :], control_points[..., 3, :], n_line)), axis=-2)
+
+
+def arc_length_table(points):
+    """
+    Cumulative arc length of densely sampled curves, computed once per curve.
+
+    Input
+      points: (B, M, 3) or (M, 3) curve samples
+    Output
+      (B, M) or (M,) lengths, starting at 0
+    """
+    points = np.asarray(points, dtype=float)
+    seg = np.linalg.norm(np.diff(points, axis=-2), axis=-1)
+    return np.concatenate((np.zeros(seg.shape[:-1] + (1,)), np.cumsum(seg, axis=-1)), axis=-1)
+
+
+def point_at_distance(points, lengths, s):
+    """
+    Position at arc length s, by searchsorted in the table and linear interpolation,
+    O(log M) per query. Distances outside [0, length] are clamped to the ends.
+
+    Input
+      points: (B, M, 3) or (M, 3) curve samples
+      lengths: (B, M) or (M,) from arc_length_table
+      s: scalar, (S,) distances shared by all curves, or (B, S)
+    Output
+      (B, S, 3), or (S, 3) for a single curve
+    """
+    points = np.asarray(points, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    single = points.ndim == 2
+    if single:
+        points, lengths = points[None], lengths[None]
+    num, m = lengths.shape
+    s = np.atleast_1d(np.asarray(s, dtype=float))
+    s = np.clip(np.broadcast_to(s, (num, s.shape[-1])), 0, lengths[:, -1:])
+
+    # 每条曲线加上不同的偏移, 一次 searchsorted 查完整个 batch
+    offset = np.arange(num)[:, None] * (lengths[:, -1].max() + 1)
+    idx = np.searchsorted((lengths + offset).ravel(), (s + offset).ravel(), side='right') - 1
+    idx = np.clip(idx.reshape(s.shape) - np.arange(num)[:, None] * m, 0, m - 2)
+
+    rows = np.arange(num)[:, None]
+    l0, l1 = lengths[rows, idx], lengths[rows, idx + 1]
+    frac = np.where(l1 > l0, (s - l0) / np.where(l1 > l0, l1 - l0, 1), 0)[..., None]
+    out = points[rows, idx] + frac * (points[rows, idx + 1] - points[rows, idx])
+    return out[0] if single else out
+
+
+def resample_by_arc_length(points, num):
+    """
+    num points equally spaced along each curve, (B, M, 3) or (M, 3) in, (B, num, 3) or (num, 3) out.
+    """
+    lengths = arc_length_table(points)
+    s = lengths[..., -1:] * np.linspace(0, 1, num)
+    return point_at_distance(points, lengths, s)
+
+
+def reference_trajectory_arc(control_points, num=100, density=1000):
+    """
+    Same path as reference_trajectory, but num points equally spaced in arc length
+    over the Bezier and the line together, instead of a hand-picked split.
+
+    Input
+      control_points: (B, 4, 3) or (4, 3) rows P0, P1, P2, P3
+      num: output samples
+      density: samples of the Bezier in the lookup table
+    Output
+      (B, num, 3) or (num, 3)
+    """
+    control_points = np.asarray(control_points, dtype=float)
+    dense = np.concatenate((bezier(control_points[..., :3, :], density),
+                            control_points[..., 3:, :]), axis=-2)
+    return resample_by_arc_length(dense, num)
+
+
+def random_control_points(base, num, scale, rng=None):
+    """
+    Randomize control points around base with gaussian noise.
+
+    Input
+      base: (K, 3) control points
+      num: number of sets
+      scale: noise std, a scalar, (K,) per control point or (K, 3)
+    Output
+      (num, K, 3)
+    """
+    rng = np.random.default_rng(rng)
+    base = np.asarray(base, dtype=float)
+    scale = np.asarray(scale, dtype=float)
+    if scale.ndim == 1:
+        scale = scale[:, None]
+    return base + rng.normal(size=(num,) + base.shape) * scale
+
+
+# 两个孔的圆柱面: (中心, 半径, plot_surface 参数), 高度 1 ~ 1.05
+HOLES = [([0, -0.25, 0], 0.025, dict(shade=False)),
+         ([0, -0.25, 0], 0.075, dict()),
+         ([0, 0.25, 0], 0.025, dict(shade=False)),
+         ([0, 0.25, 0], 0.075, dict())]
+HOLE_HEIGHT = (1, 1.05)
+PLANES = dict(xy=(0, 1), xz=(0, 2), yz=(1, 2))
+
+
+@lru_cache(maxsize=None)
+def env_surfaces(division=40):
+    """
+    Meshgrids of the hole cylinders, computed once and shared by every figure.
+    """
+    return [get_cyn_by_axes(offset=offset, division=division, main_axis='z', height_end=HOLE_HEIGHT[1],
+                            height_start=HOLE_HEIGHT[0], radius=radius) + (kwargs,)
+            for offset, radius, kwargs in HOLES]
+
+
+def plot_env(axes, division=40):
+    # left hole, right hole
+    for cx, cy, cz, kwargs in env_surfaces(division):
+        axes.plot_surface(cx, cy, cz, rstride=1, cstride=1, linewidth=0, alpha=0.25, color='b', **kwargs)
+
+
+@lru_cache(maxsize=None)
+def env_outlines(plane, division=40):
+    """
+    Outlines of the hole cylinders projected on plane, circles on xy and rectangles on xz / yz.
+    """
+    outlines = []
+    for cx, cy, cz, _ in env_surfaces(division):
+        points = np.stack((cx, cy, cz), axis=-1)[..., list(PLANES[plane])]
+        if plane == 'xy':
+            outlines.append(points[0])
+        else:
+            lo, hi = points.min(axis=(0, 1)), points.max(axis=(0, 1))
+            outlines.append(np.array([lo, [hi[0], lo[1]], hi, [lo[0], hi[1]], lo]))
+    return outlines
+
+
+def plot_env_2d(axes, plane='xy', division=40):
+    axes.add_collection(LineCollection(env_outlines(plane, division), colors='b', alpha=0.5, linewidths=1))
+
+
+def plot_trajectories(axes, trajectories, colors=None, plane=None, **kwargs):
+    """
+    Draw many trajectories as one line collection instead of one ax.plot per trajectory.
+
+    Input
+      axes: a 3D axes, or a 2D axes with plane
+      trajectories: (N, M, 3) array or a list of (M_i, 3) arrays
+      colors: one colour, or one per trajectory
+      plane: None for 3D, or 'xy', 'xz', 'yz' to draw the projection on a 2D axes
+      kwargs: passed to the collection, e.g. linewidths, alpha, label
+    Output
+      the Line3DCollection or LineCollection
+    """
+    segments = [np.asarray(trajectory, dtype=float) for trajectory in trajectories]
+    if plane is None:
+        had_data = axes.has_data()
+        collection = Line3DCollection(segments, colors=colors, **kwargs)
+        axes.add_collection(collection)
+        points = np.concatenate(segments)
+        axes.auto_scale_xyz(points[:, 0], points[:, 1], points[:, 2], had_data=had_data)
+    else:
+        collection = LineCollection([segment[:, list(PLANES[plane])] for segment in segments],
+                                    colors=colors, **kwargs)
+        axes.add_collection(collection)
+        axes.autoscale_view()
+    return collection
 
 
 def get_cyn_by_axes(radius, height_start, height_end, offset, division, main_axis):
@@ -81,50 +300,15 @@ if __name__ == '__main__':
     fig = plt.figure()
 
     # 设置三维图形模式
-    ax = fig.gca(projection='3d')
+    ax = fig.add_subplot(projection='3d')
 
     # 测试数据
     # 0.800 --hole bottom -- 1
     # 0.850 --hole top -- 1.05
     # 0.8775 -- P -- 1.0775
     # 0.8975 -- P
-    # P0 = np.array([-0.2, -0.25,  1.045])
-    # Q0 = np.array([-0.2,  0.25,  1.045])
-    # P1 = np.array([0., -0.25,  1.15])
-    # Q1 = np.array([0.,  0.25,  1.15])
-    # P2 = np.array([0., -0.25,  1.1])
-    # Q2 = np.array([0.,  0.25,  1.1])
-    # P3 = np.array([0., -0.25,  1.0575])
-    # Q3 = np.array([0.,  0.25,  1.0575])
-
-    P0 = np.array([-0.2, -0.25,  1.055])
-    Q0 = np.array([-0.2,  0.25,  1.055])
-    P1 = np.array([-0.105, -0.25,  1.6])
-    Q1 = np.array([-0.095,  0.25,  1.6])
-    P2 = np.array([-0.005, -0.25,  1.485])
-    Q2 = np.array([0.005,  0.25,  1.485])
-    P3 = np.array([-0.005, -0.25,  1.4655])
-    Q3 = np.array([0.005,  0.25,  1.4655])
-
-    # 定义贝塞尔曲线
-    def p_bezier(t):
-        return (1 - t) ** 2 * P0 + 2 * t * (1 - t) * P1 + t ** 2 * P2
-
-    def q_bezier(t):
-        return (1 - t)**2 * Q0 + 2 * t * (1 - t) * Q1 + t**2 * Q2
-
-    # 定义直线
-    def p_line(t):
-        return (1 - t) * P2 + t * P3
-
-    def q_line(t):
-        return (1 - t) * Q2 + t * Q3
-
-    # 在 [0, 1] 范围内的 50 个点上验证贝塞尔曲线
-    p_points = np.concatenate((np.array([p_bezier(t) for t in np.linspace(0, 1, 85)]),
-                              np.array([p_line(t) for t in np.linspace(0, 1, 15)])))
-    q_points = np.concatenate((np.array([q_bezier(t) for t in np.linspace(0, 1, 85)]),
-                              np.array([q_line(t) for t in np.linspace(0, 1, 15)])))
+    # 贝塞尔曲线 + 直线, 两条轨迹一起计算
+    p_points, q_points = reference_trajectory(REFERENCE_CONTROL_POINTS['dualarmrod'], n_bezier=85, n_line=15)
 
     # 分别获取点的 x 坐标和 y 坐标和 z 坐标
     Px, Py, Pz = p_points[:, 0], p_points[:, 1], p_points[:, 2]